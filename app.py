@@ -1,87 +1,2343 @@
 import streamlit as st
 import requests
+from requests.adapters import HTTPAdapter
 import json
 import base64
 from PIL import Image
 import io
 import time
+import random
+import re
 import os
+import asyncio
+import importlib.util
+import hashlib
+import sqlite3
+import unicodedata
+import zlib
+import contextlib
+import threading
+import contextvars
+import functools
+import logging
+import uuid
+import bisect
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import numpy as np
 import fitz  # PyMuPDF
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+# h2 패키지가 있으면 비동기 클라이언트에서 HTTP/2 사용
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+try:
+    from opentelemetry import trace as otel_trace
+except ImportError:
+    otel_trace = None
+
+
+OPENAI_BASE_URL = "https://api.openai.com/v1"
+OPENAI_MODEL = "gpt-4o"
+# 페이지 분석 프롬프트를 수정하면 버전을 올려 기존 캐시를 무효화
+STYLE_PROMPT_VERSION = "page-v1"
+PAGE_STYLE_SCHEMA = """{
+  "color_palette": {
+    "primary": "#color_code",
+    "secondary": "#color_code",
+    "accent": "#color_code", 
+    "background": "#color_code",
+    "text": "#color_code"
+  },
+  "typography": {
+    "title_font": "estimated_font_name",
+    "body_font": "estimated_font_name",
+    "title_size": "large/medium/small",
+    "body_size": "large/medium/small"
+  },
+  "layout": {
+    "alignment": "center/left/right",
+    "spacing": "tight/normal/loose",
+    "title_position": "top-center/top-left"
+  },
+  "visual_style": {
+    "design_approach": "minimalist/corporate/academic",
+    "border_style": "none/thin/thick",
+    "shadow_style": "none/subtle/prominent"
+  },
+  "brand_description": "Overall style description in one sentence",
+  "has_diagrams": true/false
+}"""
+
+MAX_ANALYSIS_PAGES = 10
+MAX_CONCURRENT_PAGES = 4
+# 한 번의 비전 요청에 함께 보낼 페이지 수 (1이면 페이지별 요청)
+PAGE_BATCH_SIZE = 4
+# 페이지 선택 로직을 수정하면 버전을 올려 기존 스타일 캐시를 무효화
+PAGE_SAMPLING_VERSION = "mmr-v1"
+PAGE_SAMPLING_DIVERSITY = 0.5
+PAGE_SAMPLING_THUMBNAIL_ZOOM = 0.15
+
+# color_palette 출처: "vision"(모델 추정), "local"(PDF 벡터 색상으로 대체), "seed"(로컬 색상을 모델에 힌트로 제공)
+PALETTE_SOURCE = "seed"
+PALETTE_CLUSTERS = 6
+# 배경과 이 거리(CIELAB ΔE) 이내인 색은 강조색 후보에서 제외
+PALETTE_MIN_BACKGROUND_DISTANCE = 10.0
+
+# typography 출처: "vision" / "local"(PDF 폰트 메타데이터로 대체) / "seed"(모델에 힌트로 제공)
+TYPOGRAPHY_SOURCE = "seed"
+# 본문 대비 이 배율 이상 큰 글자를 제목 후보로 간주
+TITLE_SIZE_RATIO = 1.25
+# 페이지 상단 이 비율 안에 있는 텍스트를 제목 위치로 간주
+TITLE_REGION_RATIO = 0.3
+
+# 스타일 통합: CIELAB 거리 이내의 색은 같은 색으로 투표, 도형이 있는 페이지는 가중치 부여
+COLOR_MATCH_DELTA_E = 5.0
+DIAGRAM_PAGE_WEIGHT = 1.5
+
+# 조기 종료: 최소 페이지 수 이상에서 모든 필드 합의도가 임계값 이상이고
+# 통합 결과가 연속으로 변하지 않으면 남은 페이지 분석 취소 (임계값 None이면 비활성)
+CONVERGENCE_THRESHOLD = 0.8
+CONVERGENCE_MIN_PAGES = 4
+CONVERGENCE_STABLE_ROUNDS = 2
+
+# 분석 방식: "vision"(모든 선택 페이지를 비전 모델로 분석) / "hybrid"(로컬 추출 우선, 부족한 부분만 비전)
+ANALYSIS_MODE = "hybrid"
+HYBRID_CONFIDENCE_THRESHOLD = 0.6
+# visual_style 등 로컬로 추출할 수 없는 필드를 위해 최소한으로 비전 분석할 페이지 수
+HYBRID_MIN_VISION_PAGES = 2
+HYBRID_DIAGRAM_MIN_DRAWINGS = 10
+# 텍스트 블록 중심이 페이지 중심에서 이 비율 이내면 가운데 정렬로 간주
+LAYOUT_CENTER_TOLERANCE = 0.05
+
+# gpt-4o high detail 입력은 2048px 정사각형 안에 맞춘 뒤 짧은 변 768px로 축소되므로
+# 그 이상 해상도로 렌더링해도 업로드 크기만 늘어남
+RENDER_MAX_LONG_SIDE = 2048
+RENDER_MAX_SHORT_SIDE = 768
+RENDER_IMAGE_FORMAT = "jpeg"
+RENDER_IMAGE_QUALITY = 85
+LEGACY_RENDER_ZOOM = 2.0
+
+HTTP_CONNECT_TIMEOUT = 10
+HTTP_READ_TIMEOUT = 180
+HTTP_POOL_SIZE = 10
+
+# 프로세스 전체(모든 Streamlit 세션)가 공유하는 OpenAI 사용량 한도
+OPENAI_REQUESTS_PER_MINUTE = 500
+OPENAI_TOKENS_PER_MINUTE = 30000
+HTTP_MAX_RETRIES = 5
+HTTP_BACKOFF_BASE_SECONDS = 1.0
+HTTP_BACKOFF_MAX_SECONDS = 60.0
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+
+# 스트리밍 SVG 미리보기 갱신 최소 간격
+SVG_PREVIEW_INTERVAL_SECONDS = 0.5
+
+# 배경 이미지는 화면 표시 크기로 한 번만 변환해 정적 파일로 제공 (정적 서빙이 꺼져 있으면 data URI)
+BACKGROUND_PATH = "background.png"
+BACKGROUND_DISPLAY_SIZE = (729, 956)
+BACKGROUND_FORMAT = "webp"
+BACKGROUND_QUALITY = 80
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+
+CACHE_PATH = os.path.join(".cache", "pptree_cache.sqlite3")
+NLP_PROMPT_VERSION = "content-v1"
+NLP_CACHE_MAX_ENTRIES = 2048
+NLP_CACHE_TTL_SECONDS = 30 * 24 * 3600
+# 의미 유사 요청 캐시 (해시 n-gram 벡터 코사인 유사도) - 자연어 처리 결과 재사용 여부, 기본은 사용 안 함
+USE_SEMANTIC_CACHE = False
+SEMANTIC_CACHE_DIMENSIONS = 1024
+# 일반 명사를 뺀 내용어 집합이 같은 후보끼리만 비교하므로 어순/표현 차이만 허용하는 높은 임계값
+SEMANTIC_CACHE_THRESHOLD = 0.9
+SEMANTIC_CACHE_MAX_ENTRIES = 5000
+# 생성 SVG 저장소: create_svg_prompt 결과 해시별로 최대 N개 변형 보관, 전체 크기 제한
+SVG_CACHE_VARIANTS = 3
+SVG_CACHE_MAX_BYTES = 200 * 1024 * 1024
+SVG_CACHE_TTL_SECONDS = 30 * 24 * 3600
+STYLE_CACHE_MAX_ENTRIES = 256
+STYLE_CACHE_TTL_SECONDS = 7 * 24 * 3600
+PAGE_CACHE_MAX_ENTRIES = 4096
+PAGE_CACHE_TTL_SECONDS = 30 * 24 * 3600
+
+# 생성 요청은 백그라운드 작업으로 실행하고 UI는 주기적으로 진행 상황만 조회
+JOB_WORKERS = 4
+JOB_THREAD_PREFIX = "pptree-job"
+JOB_POLL_INTERVAL_SECONDS = 1.0
+JOB_TTL_SECONDS = 24 * 3600
+# 작업 상태/결과를 저장할 SQLite 경로 (None이면 메모리에만 보관)
+JOB_STORE_PATH = CACHE_PATH
+JOB_STORE_MAX_ENTRIES = 1024
+JOB_MAX_MESSAGES = 20
+JOB_QUERY_PARAM = "job"
+
+# 단계별 지연 시간/토큰/바이트 계측 - JSON 로그(stderr), OpenTelemetry span, Prometheus /metrics
+TELEMETRY_JSON_LOGS = True
+TELEMETRY_LOGGER = "pptree.telemetry"
+TELEMETRY_DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+METRICS_HOST = "127.0.0.1"
+# None이면 /metrics 엔드포인트를 열지 않음
+METRICS_PORT = 9464
+
+API_KEY_PATH = "api_key.txt"
 
 
 def load_api_key():
+    """API 키 로드 - 파일이 바뀌었을 때만 다시 읽음"""
     try:
-        with open('api_key.txt', 'r') as f:
-            return f.read().strip()
-    except FileNotFoundError:
+        mtime = os.path.getmtime(API_KEY_PATH)
+    except OSError:
         st.error("api_key.txt 파일을 찾을 수 없습니다. API 키를 파일에 저장해주세요.")
         return None
+    return read_api_key_file(API_KEY_PATH, mtime)
+
+
+@st.cache_resource(show_spinner=False, max_entries=1)
+def read_api_key_file(path, mtime):
+    with open(path, 'r') as f:
+        return f.read().strip()
+
+
+def create_thread_pool(max_workers):
+    """현재 Streamlit 세션 컨텍스트를 공유하는 스레드 풀 생성"""
+    script_ctx = get_script_run_ctx(suppress_warning=True)
+
+    def attach_script_ctx():
+        if script_ctx is not None:
+            add_script_run_ctx(threading.current_thread(), script_ctx)
+
+    # 작업 스레드 안에서 만든 풀은 스레드 이름으로 소속 작업을 알 수 있게 함
+    return ThreadPoolExecutor(
+        max_workers=max_workers, initializer=attach_script_ctx,
+        thread_name_prefix=f"{threading.current_thread().name}-pool"
+    )
+
+
+def submit_in_context(executor, fn, *args, **kwargs):
+    """현재 컨텍스트(st.status 등 출력 위치 포함)를 유지한 채 작업 제출"""
+    ctx = contextvars.copy_context()
+    return executor.submit(ctx.run, fn, *args, **kwargs)
+
+
+# 작업 스레드에는 세션 컨텍스트가 없어 st.error/st.warning이 무시되므로 단계 메시지를 대신 받을 곳
+STAGE_MESSAGE_SINK = contextvars.ContextVar("pptree_stage_message_sink", default=None)
+
+
+def notify(level, message):
+    """st.error/st.warning으로 표시하고, 메시지 수집기가 설정되어 있으면 함께 전달"""
+    sink = STAGE_MESSAGE_SINK.get()
+    if sink is not None:
+        sink(level, message)
+    getattr(st, level)(message)
+
+
+def parse_duration_seconds(value):
+    """'1s', '6m0s', '20ms', '1.5' 형태의 기간 문자열을 초로 변환"""
+    if value is None:
+        return None
+
+    value = str(value).strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+
+    units = {"h": 3600.0, "m": 60.0, "s": 1.0, "ms": 0.001}
+    matches = re.findall(r"(\d+(?:\.\d+)?)(ms|h|m|s)", value)
+    if not matches:
+        return None
+    return sum(float(amount) * units[unit] for amount, unit in matches)
+
+
+def estimate_request_tokens(payload):
+    """요청 payload의 대략적인 토큰 사용량 추정 (텍스트 4자당 1토큰 + 이미지 + 최대 응답)"""
+    text_chars = 0
+    image_count = 0
+
+    for message in payload.get("messages", []):
+        content = message.get("content")
+        if isinstance(content, str):
+            text_chars += len(content)
+            continue
+        for part in content or []:
+            if part.get("type") == "text":
+                text_chars += len(part.get("text", ""))
+            elif part.get("type") == "image_url":
+                image_count += 1
+
+    # 고해상도 이미지 한 장은 타일 기준 약 765 토큰
+    return text_chars // 4 + image_count * 765 + payload.get("max_tokens", 0)
+
+
+class Telemetry:
+    """파이프라인 단계별 span과 지표 수집 - JSON 로그, OpenTelemetry span, Prometheus 텍스트로 내보냄
+
+    span은 contextvar로 전파되므로(submit_in_context, asyncio 태스크 포함) 그 안에서 일어난 HTTP 요청, 토큰 사용량,
+    캐시 조회, 렌더링은 가장 안쪽 단계 이름으로 지표에 집계되고 열려 있는 모든 span의 합계에도 더해진다.
+    """
+
+    def __init__(self, json_logs=TELEMETRY_JSON_LOGS, buckets=TELEMETRY_DURATION_BUCKETS):
+        self.json_logs = json_logs
+        self.buckets = tuple(buckets)
+        self.counters = {}
+        self.histograms = {}
+        self.lock = threading.Lock()
+        self.open_spans = contextvars.ContextVar("pptree_spans", default=())
+
+        self.logger = logging.getLogger(TELEMETRY_LOGGER)
+        if json_logs and not self.logger.handlers:
+            handler = logging.StreamHandler()
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            self.logger.addHandler(handler)
+            self.logger.setLevel(logging.INFO)
+            self.logger.propagate = False
+
+    @property
+    def stage(self):
+        spans = self.open_spans.get()
+        return spans[-1]["name"] if spans else "none"
+
+    @contextlib.contextmanager
+    def span(self, name, **attributes):
+        """단계 실행 구간 측정 - 반환된 dict에 속성을 추가하면 로그/OTel span에 함께 기록"""
+        span_record = {"name": name, "attributes": attributes, "status": "ok"}
+        token = self.open_spans.set(self.open_spans.get() + (span_record,))
+        started = time.perf_counter()
+        status = None
+
+        # 취소는 오류가 아니므로 OTel span 상태는 아래에서 직접 설정
+        otel_span_cm = (
+            otel_trace.get_tracer("pptree").start_as_current_span(name, set_status_on_exception=False)
+            if otel_trace else contextlib.nullcontext()
+        )
+        with otel_span_cm as otel_span:
+            try:
+                yield attributes
+            except asyncio.CancelledError:
+                # 수렴 후 조기 종료 등 의도한 취소
+                status = "cancelled"
+                raise
+            except BaseException:
+                status = "error"
+                raise
+            finally:
+                duration = time.perf_counter() - started
+                status = status or span_record["status"]
+                self.open_spans.reset(token)
+                with self.lock:
+                    attributes = {
+                        key: round(value, 1) if isinstance(value, float) else value
+                        for key, value in attributes.items()
+                    }
+
+                if otel_span is not None:
+                    for key, value in attributes.items():
+                        otel_span.set_attribute(
+                            f"pptree.{key}", value if isinstance(value, (str, bool, int, float)) else str(value)
+                        )
+                    otel_span.set_attribute("pptree.status", status)
+                    if status == "error":
+                        otel_span.set_status(otel_trace.Status(otel_trace.StatusCode.ERROR))
+                self.observe("pptree_span_duration_seconds", duration, span=name, status=status)
+                self.log("span", span=name, status=status, duration_ms=round(duration * 1000, 1), **attributes)
+
+    def mark_failed(self):
+        """가장 안쪽 span을 error 상태로 표시 (예외 대신 None을 반환해 실패를 알리는 단계용)"""
+        spans = self.open_spans.get()
+        if spans:
+            spans[-1]["status"] = "error"
+
+    @staticmethod
+    def is_failure(result):
+        # 단계는 실패 시 None 또는 (None, None)을 반환
+        return not result or (isinstance(result, tuple) and all(item is None for item in result))
+
+    def traced(self, name):
+        """함수 전체를 span으로 감싸는 데코레이터 (코루틴 함수 지원, 실패 반환값이면 error 상태)"""
+        def decorator(fn):
+            if asyncio.iscoroutinefunction(fn):
+                @functools.wraps(fn)
+                async def async_wrapper(*args, **kwargs):
+                    with self.span(name):
+                        result = await fn(*args, **kwargs)
+                        if self.is_failure(result):
+                            self.mark_failed()
+                        return result
+                return async_wrapper
+
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self.span(name):
+                    result = fn(*args, **kwargs)
+                    if self.is_failure(result):
+                        self.mark_failed()
+                    return result
+            return wrapper
+        return decorator
+
+    def add_to_spans(self, **amounts):
+        """열려 있는 모든 span의 합계 속성에 더함"""
+        with self.lock:
+            for span in self.open_spans.get():
+                attributes = span["attributes"]
+                for key, amount in amounts.items():
+                    attributes[key] = attributes.get(key, 0) + amount
+
+    def count(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = {"buckets": [0] * (len(self.buckets) + 1), "sum": 0.0, "count": 0}
+            histogram["buckets"][bisect.bisect_left(self.buckets, value)] += 1
+            histogram["sum"] += value
+            histogram["count"] += 1
+
+    def log(self, event, **fields):
+        if self.json_logs:
+            self.logger.info(json.dumps(
+                {"ts": round(time.time(), 3), "event": event, **fields}, ensure_ascii=False, default=str
+            ))
+
+    def record_http(self, status, seconds, request_bytes, attempt):
+        """HTTP 시도 한 번의 지연 시간과 전송 바이트 (현재 단계 기준)"""
+        stage = self.stage
+        self.observe("pptree_http_request_duration_seconds", seconds, stage=stage, status=str(status))
+        self.count("pptree_http_request_bytes_total", request_bytes, stage=stage)
+        self.add_to_spans(http_requests=1, http_ms=seconds * 1000, request_bytes=request_bytes)
+        self.log(
+            "http", stage=stage, status=status, attempt=attempt,
+            latency_ms=round(seconds * 1000, 1), request_bytes=request_bytes
+        )
+
+    def record_usage(self, usage, estimated=False):
+        """응답 usage의 prompt/completion 토큰 (현재 단계 기준)"""
+        stage = self.stage
+        prompt_tokens = usage.get("prompt_tokens") or 0
+        completion_tokens = usage.get("completion_tokens") or 0
+        self.count("pptree_tokens_total", prompt_tokens, stage=stage, type="prompt")
+        self.count("pptree_tokens_total", completion_tokens, stage=stage, type="completion")
+        self.add_to_spans(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+        self.log(
+            "usage", stage=stage, prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens, estimated=estimated
+        )
+
+    def record_cache(self, cache, hit):
+        self.count("pptree_cache_requests_total", cache=cache, result="hit" if hit else "miss")
+        self.add_to_spans(**{"cache_hits" if hit else "cache_misses": 1})
+
+    def record_render(self, rasterize_seconds, encode_seconds, image_bytes, image_format):
+        """페이지 래스터화/이미지 인코딩 시간과 결과 크기"""
+        self.observe("pptree_render_seconds", rasterize_seconds, step="rasterize")
+        self.observe("pptree_render_seconds", encode_seconds, step="encode", format=image_format)
+        self.count("pptree_render_bytes_total", image_bytes, format=image_format)
+        self.add_to_spans(
+            pages_rendered=1, rasterize_ms=rasterize_seconds * 1000,
+            encode_ms=encode_seconds * 1000, image_bytes=image_bytes
+        )
+
+    def prometheus_text(self):
+        """Prometheus 텍스트 노출 형식"""
+        with self.lock:
+            counters = dict(self.counters)
+            histograms = {
+                key: dict(value, buckets=list(value["buckets"])) for key, value in self.histograms.items()
+            }
+
+        def format_labels(labels):
+            if not labels:
+                return ""
+            pairs = []
+            for key, value in labels:
+                value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+                pairs.append(f'{key}="{value}"')
+            return "{" + ",".join(pairs) + "}"
+
+        lines = []
+        for metric in sorted({name for name, _ in counters}):
+            lines.append(f"# TYPE {metric} counter")
+            for (name, labels), value in sorted(counters.items()):
+                if name == metric:
+                    lines.append(f"{metric}{format_labels(labels)} {value}")
+
+        for metric in sorted({name for name, _ in histograms}):
+            lines.append(f"# TYPE {metric} histogram")
+            for (name, labels), histogram in sorted(histograms.items()):
+                if name != metric:
+                    continue
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, histogram["buckets"]):
+                    cumulative += bucket_count
+                    lines.append(f"{metric}_bucket{format_labels(labels + (('le', bound),))} {cumulative}")
+                lines.append(f"{metric}_bucket{format_labels(labels + (('le', '+Inf'),))} {histogram['count']}")
+                lines.append(f"{metric}_sum{format_labels(labels)} {histogram['sum']}")
+                lines.append(f"{metric}_count{format_labels(labels)} {histogram['count']}")
+
+        return "\n".join(lines) + "\n"
+
+
+TELEMETRY = Telemetry()
+
+
+def configure_otel_exporter():
+    """OTEL_EXPORTER_OTLP_ENDPOINT가 설정되어 있고 SDK/OTLP exporter가 설치되어 있으면 span 내보내기 설정"""
+    if otel_trace is None or not os.environ.get("OTEL_EXPORTER_OTLP_ENDPOINT"):
+        return False
+    if not isinstance(otel_trace.get_tracer_provider(), otel_trace.ProxyTracerProvider):
+        # opentelemetry-instrument 등으로 이미 설정됨
+        return True
+
+    try:
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+    except ImportError:
+        return False
+
+    provider = TracerProvider(resource=Resource.create({"service.name": "pptree"}))
+    provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter()))
+    otel_trace.set_tracer_provider(provider)
+    return True
+
+
+def start_metrics_server(port=METRICS_PORT, host=METRICS_HOST, telemetry=None):
+    """Prometheus가 수집할 /metrics 엔드포인트를 데몬 스레드에서 실행"""
+    telemetry = telemetry or TELEMETRY
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+
+            body = telemetry.prometheus_text().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="pptree-metrics", daemon=True).start()
+    return server
+
+
+class RateLimiter:
+    """분당 요청 수/토큰 수 토큰 버킷 - 한도 초과 시 실패 대신 대기"""
+
+    def __init__(self, requests_per_minute, tokens_per_minute):
+        self.request_capacity = float(requests_per_minute)
+        self.token_capacity = float(tokens_per_minute)
+        self.available_requests = self.request_capacity
+        self.available_tokens = self.token_capacity
+        self.updated_at = time.monotonic()
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+
+    def _refill(self, now):
+        elapsed = now - self.updated_at
+        self.updated_at = now
+        self.available_requests = min(
+            self.request_capacity, self.available_requests + elapsed * self.request_capacity / 60.0
+        )
+        self.available_tokens = min(
+            self.token_capacity, self.available_tokens + elapsed * self.token_capacity / 60.0
+        )
+
+    def reserve(self, tokens):
+        """예산이 있으면 차감 후 0을, 없으면 기다려야 할 초를 반환"""
+        tokens = min(float(tokens), self.token_capacity)
+
+        with self.lock:
+            now = time.monotonic()
+            self._refill(now)
+
+            if now < self.paused_until:
+                return self.paused_until - now
+
+            if self.available_requests >= 1 and self.available_tokens >= tokens:
+                self.available_requests -= 1
+                self.available_tokens -= tokens
+                return 0.0
+
+            request_wait = max(0.0, 1 - self.available_requests) * 60.0 / self.request_capacity
+            token_wait = max(0.0, tokens - self.available_tokens) * 60.0 / self.token_capacity
+            return max(request_wait, token_wait, 0.01)
+
+    def acquire(self, tokens):
+        """예산이 생길 때까지 대기 (큐잉)"""
+        while True:
+            wait = self.reserve(tokens)
+            if wait <= 0:
+                return
+            time.sleep(wait)
+
+    async def acquire_async(self, tokens):
+        """acquire의 asyncio 버전 - 이벤트 루프를 막지 않고 대기"""
+        while True:
+            wait = self.reserve(tokens)
+            if wait <= 0:
+                return
+            await asyncio.sleep(wait)
+
+    def pause(self, seconds):
+        """서버가 요청한 시간 동안 모든 호출을 일시 중지"""
+        with self.lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def update_from_headers(self, headers):
+        """x-ratelimit-* 응답 헤더로 남은 한도가 소진되면 리셋 시점까지 대기"""
+        for kind in ("requests", "tokens"):
+            remaining = headers.get(f"x-ratelimit-remaining-{kind}")
+            reset = parse_duration_seconds(headers.get(f"x-ratelimit-reset-{kind}"))
+            if remaining is not None and reset is not None and remaining.strip() == "0":
+                self.pause(reset)
+
+
+SHARED_RATE_LIMITER = RateLimiter(OPENAI_REQUESTS_PER_MINUTE, OPENAI_TOKENS_PER_MINUTE)
+
+
+class BaseChatClient:
+    """동기/비동기 클라이언트가 공유하는 엔드포인트, 한도, 재시도 정책"""
+
+    def __init__(self, openai_key, base_url, rate_limiter, max_retries):
+        self.chat_url = f"{base_url.rstrip('/')}/chat/completions"
+        self.headers = {
+            "Content-Type": "application/json; charset=utf-8",
+            "Authorization": f"Bearer {openai_key}"
+        }
+        self.rate_limiter = rate_limiter or SHARED_RATE_LIMITER
+        self.max_retries = max_retries
+
+    def backoff_delay(self, attempt):
+        """full jitter 지수 백오프"""
+        ceiling = min(HTTP_BACKOFF_MAX_SECONDS, HTTP_BACKOFF_BASE_SECONDS * (2 ** attempt))
+        return random.uniform(0, ceiling)
+
+    def retry_after(self, response):
+        """Retry-After / retry-after-ms 헤더 해석"""
+        retry_after_ms = response.headers.get("retry-after-ms")
+        if retry_after_ms is not None:
+            try:
+                return float(retry_after_ms) / 1000.0
+            except ValueError:
+                pass
+
+        return parse_duration_seconds(response.headers.get("retry-after"))
+
+    def record_usage(self, response):
+        """성공한 (비스트리밍) 응답의 usage를 계측에 반영 (requests/httpx 공통)"""
+        if response.status_code != 200:
+            return
+        try:
+            usage = response.json().get("usage")
+        except ValueError:
+            return
+        if usage:
+            TELEMETRY.record_usage(usage)
+
+    def retry_delay(self, response, attempt):
+        """재시도 대상 응답이면 대기할 초를, 아니면 None 반환 (429는 전역 일시 중지)"""
+        self.rate_limiter.update_from_headers(response.headers)
+
+        if response.status_code not in RETRYABLE_STATUS_CODES or attempt == self.max_retries:
+            return None
+
+        delay = self.retry_after(response)
+        if delay is None:
+            delay = self.backoff_delay(attempt)
+        if response.status_code == 429:
+            # 같은 프로세스의 다른 요청도 함께 대기하도록 전역 일시 중지
+            self.rate_limiter.pause(delay)
+        return delay
+
+
+class OpenAIClient(BaseChatClient):
+    """keep-alive 커넥션 풀을 공유하는 OpenAI HTTP 클라이언트"""
+
+    def __init__(self, openai_key, base_url=OPENAI_BASE_URL,
+                 connect_timeout=HTTP_CONNECT_TIMEOUT, read_timeout=HTTP_READ_TIMEOUT,
+                 pool_size=HTTP_POOL_SIZE, rate_limiter=None, max_retries=HTTP_MAX_RETRIES):
+        super().__init__(openai_key, base_url, rate_limiter, max_retries)
+        self.timeout = (connect_timeout, read_timeout)
+
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def post_chat(self, payload, stream=False):
+        """chat completions 요청 (한도 대기 + 지수 백오프 재시도)"""
+        estimated_tokens = estimate_request_tokens(payload)
+        # 재시도마다 다시 직렬화하지 않고, 전송 바이트도 계측
+        body = json.dumps(payload).encode("utf-8")
+
+        for attempt in range(self.max_retries + 1):
+            self.rate_limiter.acquire(estimated_tokens)
+
+            started = time.perf_counter()
+            try:
+                response = self.session.post(self.chat_url, data=body, timeout=self.timeout, stream=stream)
+            except (requests.ConnectionError, requests.Timeout):
+                TELEMETRY.record_http("error", time.perf_counter() - started, len(body), attempt)
+                if attempt == self.max_retries:
+                    raise
+                time.sleep(self.backoff_delay(attempt))
+                continue
+            TELEMETRY.record_http(response.status_code, time.perf_counter() - started, len(body), attempt)
+
+            delay = self.retry_delay(response, attempt)
+            if delay is None:
+                if not stream:
+                    self.record_usage(response)
+                return response
+            # 스트리밍 응답은 본문을 읽지 않았으므로 닫아야 연결이 풀로 돌아감
+            response.close()
+            time.sleep(delay)
+
+        return response
+
+    def iter_chat_stream(self, response):
+        """SSE 스트림 응답에서 content 조각을 도착 순서대로 반환"""
+        response.encoding = "utf-8"
+
+        for line in response.iter_lines(decode_unicode=True):
+            if not line or not line.startswith("data:"):
+                continue
+
+            data = line[len("data:"):].strip()
+            if data == "[DONE]":
+                break
+
+            chunk = json.loads(data)
+            if chunk.get("usage"):
+                # stream_options.include_usage를 요청하면 마지막 조각에 usage가 옴
+                TELEMETRY.record_usage(chunk["usage"])
+
+            choices = chunk.get("choices") or []
+            if not choices:
+                continue
+
+            delta = choices[0].get("delta", {}).get("content")
+            if delta:
+                yield delta
+
+    def close(self):
+        self.session.close()
+
+
+class AsyncOpenAIClient(BaseChatClient):
+    """httpx.AsyncClient 기반 비동기 OpenAI 클라이언트 (동기 클라이언트와 같은 한도/재시도 정책)"""
+
+    def __init__(self, openai_key, base_url=OPENAI_BASE_URL,
+                 connect_timeout=HTTP_CONNECT_TIMEOUT, read_timeout=HTTP_READ_TIMEOUT,
+                 pool_size=HTTP_POOL_SIZE, rate_limiter=None, max_retries=HTTP_MAX_RETRIES):
+        if httpx is None:
+            raise RuntimeError("비동기 파이프라인에는 httpx가 필요합니다: pip install httpx")
+
+        super().__init__(openai_key, base_url, rate_limiter, max_retries)
+        self.client = httpx.AsyncClient(
+            headers=self.headers,
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+            http2=HTTP2_AVAILABLE
+        )
+
+    async def post_chat(self, payload):
+        """chat completions 비동기 요청 (한도 대기 + 지수 백오프 재시도)"""
+        estimated_tokens = estimate_request_tokens(payload)
+        body = json.dumps(payload).encode("utf-8")
+
+        for attempt in range(self.max_retries + 1):
+            await self.rate_limiter.acquire_async(estimated_tokens)
+
+            started = time.perf_counter()
+            try:
+                response = await self.client.post(self.chat_url, content=body)
+            except httpx.TransportError:
+                TELEMETRY.record_http("error", time.perf_counter() - started, len(body), attempt)
+                if attempt == self.max_retries:
+                    raise
+                await asyncio.sleep(self.backoff_delay(attempt))
+                continue
+            TELEMETRY.record_http(response.status_code, time.perf_counter() - started, len(body), attempt)
+
+            delay = self.retry_delay(response, attempt)
+            if delay is None:
+                self.record_usage(response)
+                return response
+            await asyncio.sleep(delay)
+
+        return response
+
+    async def aclose(self):
+        await self.client.aclose()
+
+
+class BackgroundEventLoop:
+    """Streamlit 스크립트 스레드에서 코루틴을 실행하기 위한 전용 이벤트 루프 스레드"""
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name="pptree-event-loop", daemon=True)
+        self.thread.start()
+
+    def submit(self, coro):
+        """코루틴을 루프에 제출하고 concurrent.futures.Future 반환"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro, timeout=None):
+        """코루틴 결과를 기다려 반환"""
+        return self.submit(coro).result(timeout)
+
+
+_background_loop = None
+_background_loop_lock = threading.Lock()
+
+
+def get_background_loop():
+    """프로세스에 하나뿐인 백그라운드 이벤트 루프 (비동기 클라이언트는 항상 같은 루프에서 사용)"""
+    global _background_loop
+    with _background_loop_lock:
+        if _background_loop is None:
+            _background_loop = BackgroundEventLoop()
+        return _background_loop
+
+
+def make_cache_key(*parts):
+    """캐시 키 구성 요소들을 하나의 해시로 변환"""
+    raw = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def normalize_request_text(text):
+    """캐시 키용 요청 정규화 (유니코드 NFKC, 소문자, 공백 축약, 끝 문장부호 제거)"""
+    normalized = unicodedata.normalize("NFKC", text).lower()
+    normalized = re.sub(r"\s+", " ", normalized).strip()
+    return normalized.rstrip(".!?。 ")
+
+
+class SemanticCache:
+    """요청 문장의 해시 n-gram 벡터로 의미가 거의 같은 이전 결과를 찾는 인메모리 캐시 (오프라인)"""
+
+    NUMBER_WORDS = {
+        "one": "1", "two": "2", "three": "3", "four": "4", "five": "5",
+        "six": "6", "seven": "7", "eight": "8", "nine": "9", "ten": "10",
+        "single": "1", "double": "2", "triple": "3",
+    }
+    SYNONYMS = {
+        "nn": "neural network", "cnn": "convolutional neural network", "rnn": "recurrent neural network",
+        "ml": "machine learning", "ai": "artificial intelligence", "chart": "graph", "figure": "diagram",
+    }
+    STOPWORDS = {
+        "a", "an", "the", "of", "with", "and", "for", "to", "in", "on", "please",
+        "make", "create", "draw", "generate", "show", "me", "i", "want", "need", "that", "has", "having",
+    }
+    # 요청 유형을 나타낼 뿐 의미를 가르지 않는 일반 명사 - 일치 조건에서 제외
+    GENERIC_WORDS = {
+        "diagram", "graph", "plot", "illustration", "image", "picture", "visual", "visualization",
+        "drawing", "slide",
+    }
+
+    def __init__(self, dimensions=SEMANTIC_CACHE_DIMENSIONS, threshold=SEMANTIC_CACHE_THRESHOLD,
+                 max_entries=SEMANTIC_CACHE_MAX_ENTRIES):
+        self.dimensions = dimensions
+        self.threshold = threshold
+        self.max_entries = max(1, max_entries)
+        # 고정 크기 링 버퍼 - 추가할 때 전체 행렬을 복사하지 않고 가장 오래된 칸을 덮어씀
+        self.vectors = np.zeros((self.max_entries, dimensions), dtype=np.float32)
+        self.entries = [None] * self.max_entries
+        self.next_slot = 0
+        self.slots_by_text = {}
+        self.slots_by_words = {}
+        self.lock = threading.Lock()
+
+    def canonical_tokens(self, text):
+        """정규화, 숫자 단어/약어 치환, 불용어 제거, 간단한 복수형 제거"""
+        text = normalize_request_text(text)
+        text = re.sub(r"(\d+)\s*-\s*", r"\1 ", text)
+        tokens = []
+        for word in re.findall(r"[\w#+]+", text):
+            word = self.NUMBER_WORDS.get(word, word)
+            for part in self.SYNONYMS.get(word, word).split():
+                if part in self.STOPWORDS:
+                    continue
+                if len(part) > 3 and part.endswith("s") and not part.endswith("ss"):
+                    part = part[:-1]
+                tokens.append(part)
+        return tokens
+
+    def embed(self, text):
+        """단어 unigram/bigram + 문자 trigram을 고정 차원에 해싱한 L2 정규화 벡터"""
+        return self.embed_tokens(self.canonical_tokens(text))
+
+    def embed_tokens(self, tokens):
+        features = list(tokens)
+        features += [f"{a}_{b}" for a, b in zip(tokens, tokens[1:])]
+        features += [f"#{word[i:i + 3]}" for word in tokens for i in range(max(len(word) - 2, 1))]
+
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        for feature in features:
+            vector[zlib.crc32(feature.encode("utf-8")) % self.dimensions] += 1.0
+
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def lookup(self, text, partition=""):
+        """(값, 일치한 원문, 유사도) 반환, 임계값 미만이면 None"""
+        match = self.find(text, partition)
+        TELEMETRY.record_cache("semantic:" + partition.split(":")[0], match is not None)
+        return match
+
+    def key_tokens(self, text):
+        """일치 조건에 쓰는 내용어 (일반 명사 제외, 숫자 포함)"""
+        return [token for token in self.canonical_tokens(text) if token not in self.GENERIC_WORDS]
+
+    def find(self, text, partition):
+        # bar/pie, TCP/TLS, 4층/5층처럼 단어 하나만 달라도 의미가 달라지므로 내용어(숫자 포함) 집합이 같아야 후보
+        tokens = self.key_tokens(text)
+        if not tokens:
+            return None
+        words_key = (partition, frozenset(tokens))
+        vector = self.embed_tokens(tokens)
+
+        with self.lock:
+            slots = list(self.slots_by_words.get(words_key, ()))
+            if not slots:
+                return None
+
+            similarities = self.vectors[slots] @ vector
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.threshold:
+                return None
+            entry = self.entries[slots[best]]
+            return entry["value"], entry["text"], float(similarities[best])
+
+    def add(self, text, value, partition=""):
+        tokens = self.key_tokens(text)
+        if not tokens:
+            return
+        text_key = (partition, normalize_request_text(text))
+        words_key = (partition, frozenset(tokens))
+
+        with self.lock:
+            # 같은 요청을 반복해서 추가해도 항목은 하나만 유지
+            slot = self.slots_by_text.get(text_key)
+            if slot is not None:
+                self.entries[slot]["value"] = value
+                return
+
+            slot = self.next_slot
+            self.next_slot = (slot + 1) % self.max_entries
+            if self.entries[slot] is not None:
+                self.forget(slot)
+
+            self.vectors[slot] = self.embed_tokens(tokens)
+            self.entries[slot] = {"text": text, "value": value, "text_key": text_key, "words_key": words_key}
+            self.slots_by_text[text_key] = slot
+            self.slots_by_words.setdefault(words_key, set()).add(slot)
+
+    def forget(self, slot):
+        """덮어쓸 칸의 이전 항목을 색인에서 제거 (잠금 안에서 호출)"""
+        entry = self.entries[slot]
+        del self.slots_by_text[entry["text_key"]]
+        same_words = self.slots_by_words[entry["words_key"]]
+        same_words.discard(slot)
+        if not same_words:
+            del self.slots_by_words[entry["words_key"]]
+        self.entries[slot] = None
+
+
+SHARED_SEMANTIC_CACHE = SemanticCache()
+
+
+class SQLiteCache:
+    """SQLite 기반 영속 캐시 (LRU 개수/크기 제한 + TTL 만료 + 적중/실패 카운터)
+
+    WAL 모드와 잠금 대기 시간을 사용하므로 같은 호스트의 여러 스레드/프로세스가 함께 사용해도 안전
+    """
+
+    def __init__(self, path, namespace, max_entries=256, ttl_seconds=None, max_bytes=None):
+        self.path = path
+        self.namespace = namespace
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+
+    def _connect(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS cache_entries (
+                namespace TEXT NOT NULL,
+                key TEXT NOT NULL,
+                value TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL,
+                PRIMARY KEY (namespace, key)
+            )
+        """)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS cache_stats (
+                namespace TEXT PRIMARY KEY,
+                hits INTEGER NOT NULL DEFAULT 0,
+                misses INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+        return conn
+
+    @contextlib.contextmanager
+    def _transaction(self):
+        conn = self._connect()
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _record(self, conn, hit):
+        TELEMETRY.record_cache(self.namespace, hit)
+        column = "hits" if hit else "misses"
+        conn.execute(
+            f"INSERT INTO cache_stats (namespace, {column}) VALUES (?, 1) "
+            f"ON CONFLICT(namespace) DO UPDATE SET {column} = {column} + 1",
+            (self.namespace,)
+        )
+
+    def stats(self):
+        """프로세스 간 공유되는 적중/실패 횟수와 적중률"""
+        try:
+            with self._transaction() as conn:
+                row = conn.execute(
+                    "SELECT hits, misses FROM cache_stats WHERE namespace = ?", (self.namespace,)
+                ).fetchone()
+                entries = conn.execute(
+                    "SELECT COUNT(*) FROM cache_entries WHERE namespace = ?", (self.namespace,)
+                ).fetchone()[0]
+        except sqlite3.Error:
+            return None
+
+        hits, misses = row or (0, 0)
+        total = hits + misses
+        return {"hits": hits, "misses": misses, "hit_rate": hits / total if total else 0.0, "entries": entries}
+
+    def _is_expired(self, created_at, now):
+        return self.ttl_seconds is not None and now - created_at > self.ttl_seconds
+
+    def get(self, key):
+        now = time.time()
+        try:
+            with self._transaction() as conn:
+                row = conn.execute(
+                    "SELECT value, created_at FROM cache_entries WHERE namespace = ? AND key = ?",
+                    (self.namespace, key)
+                ).fetchone()
+
+                if row is None:
+                    self._record(conn, hit=False)
+                    return None
+
+                value, created_at = row
+                if self._is_expired(created_at, now):
+                    conn.execute(
+                        "DELETE FROM cache_entries WHERE namespace = ? AND key = ?",
+                        (self.namespace, key)
+                    )
+                    self._record(conn, hit=False)
+                    return None
+
+                self._record(conn, hit=True)
+                conn.execute(
+                    "UPDATE cache_entries SET accessed_at = ? WHERE namespace = ? AND key = ?",
+                    (now, self.namespace, key)
+                )
+                return json.loads(value)
+        except (sqlite3.Error, json.JSONDecodeError):
+            # 캐시 오류는 파이프라인을 막지 않도록 미스로 처리
+            return None
+
+    def set(self, key, value):
+        now = time.time()
+        try:
+            with self._transaction() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO cache_entries (namespace, key, value, created_at, accessed_at) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (self.namespace, key, json.dumps(value, ensure_ascii=False), now, now)
+                )
+                self._evict(conn, now)
+        except sqlite3.Error:
+            pass
+
+    def _evict(self, conn, now):
+        if self.ttl_seconds is not None:
+            conn.execute(
+                "DELETE FROM cache_entries WHERE namespace = ? AND created_at < ?",
+                (self.namespace, now - self.ttl_seconds)
+            )
+
+        if self.max_entries is not None:
+            conn.execute("""
+                DELETE FROM cache_entries
+                WHERE namespace = ? AND key NOT IN (
+                    SELECT key FROM cache_entries WHERE namespace = ?
+                    ORDER BY accessed_at DESC LIMIT ?
+                )
+            """, (self.namespace, self.namespace, self.max_entries))
+
+        if self.max_bytes is not None:
+            # 최근 사용 순으로 누적 크기가 한도를 넘는 항목 제거
+            conn.execute("""
+                DELETE FROM cache_entries
+                WHERE namespace = ? AND key IN (
+                    SELECT key FROM (
+                        SELECT key, SUM(LENGTH(value)) OVER (ORDER BY accessed_at DESC, key) AS running_bytes
+                        FROM cache_entries WHERE namespace = ?
+                    ) WHERE running_bytes > ?
+                )
+            """, (self.namespace, self.namespace, self.max_bytes))
+
+
+class RenderPolicy:
+    """비전 모델 유효 입력 해상도에 맞춘 페이지 렌더링/인코딩 정책"""
+
+    MIME_TYPES = {"png": "image/png", "jpeg": "image/jpeg", "webp": "image/webp"}
+
+    def __init__(self, max_long_side=RENDER_MAX_LONG_SIDE, max_short_side=RENDER_MAX_SHORT_SIDE,
+                 image_format=RENDER_IMAGE_FORMAT, quality=RENDER_IMAGE_QUALITY):
+        if image_format not in self.MIME_TYPES:
+            raise ValueError(f"지원하지 않는 이미지 형식: {image_format}")
+
+        self.max_long_side = max_long_side
+        self.max_short_side = max_short_side
+        self.image_format = image_format
+        self.quality = quality
+
+    @property
+    def mime_type(self):
+        return self.MIME_TYPES[self.image_format]
+
+    def zoom_for(self, page):
+        """페이지 크기(pt)에서 목표 해상도를 넘지 않는 배율 계산"""
+        long_side = max(page.rect.width, page.rect.height)
+        short_side = min(page.rect.width, page.rect.height)
+        return min(self.max_long_side / long_side, self.max_short_side / short_side)
+
+    def render(self, page):
+        """페이지를 렌더링해 (이미지 바이트, 통계) 반환"""
+        zoom = self.zoom_for(page)
+        started = time.perf_counter()
+        pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), alpha=False)
+        rasterized = time.perf_counter()
+
+        if self.image_format == "png":
+            img_data = pix.tobytes("png")
+        else:
+            image = Image.frombytes("RGB", (pix.width, pix.height), pix.samples)
+            buffer = io.BytesIO()
+            image.save(buffer, format=self.image_format.upper(), quality=self.quality)
+            img_data = buffer.getvalue()
+        encoded = time.perf_counter()
+
+        TELEMETRY.record_render(rasterized - started, encoded - rasterized, len(img_data), self.image_format)
+
+        legacy_pixels = (page.rect.width * LEGACY_RENDER_ZOOM) * (page.rect.height * LEGACY_RENDER_ZOOM)
+        stats = {
+            "width": pix.width,
+            "height": pix.height,
+            "bytes": len(img_data),
+            "base64_bytes": (len(img_data) + 2) // 3 * 4,
+            # 측정한 바이트가 아니라 기존 2x 렌더와의 픽셀 수 비교 - 작은 페이지는 2x보다 크게 렌더링될 수 있어 0에서 자름
+            "legacy_pixel_savings": max(0.0, 1 - (pix.width * pix.height) / legacy_pixels),
+            "rasterize_ms": round((rasterized - started) * 1000, 1),
+            "encode_ms": round((encoded - rasterized) * 1000, 1),
+        }
+        return img_data, stats
+
+
+def rgb_to_hex(rgb):
+    """0~1 RGB 튜플을 #rrggbb로 변환"""
+    return "#{:02x}{:02x}{:02x}".format(*(int(round(max(0.0, min(1.0, c)) * 255)) for c in rgb[:3]))
+
+
+def hex_to_rgb(hex_color):
+    """#rrggbb(또는 #rgb)를 0~1 RGB 튜플로 변환, 형식이 다르면 None"""
+    value = str(hex_color).strip().lstrip("#")
+    if len(value) == 3:
+        value = "".join(c * 2 for c in value)
+    if len(value) != 6:
+        return None
+    try:
+        return tuple(int(value[i:i + 2], 16) / 255.0 for i in (0, 2, 4))
+    except ValueError:
+        return None
+
+
+def srgb_to_lab(rgb):
+    """(N, 3) sRGB(0~1) 배열을 CIELAB(D65)로 벡터 변환"""
+    rgb = np.asarray(rgb, dtype=np.float64)
+    linear = np.where(rgb <= 0.04045, rgb / 12.92, ((rgb + 0.055) / 1.055) ** 2.4)
+
+    xyz = linear @ np.array([
+        [0.4124564, 0.2126729, 0.0193339],
+        [0.3575761, 0.7151522, 0.1191920],
+        [0.1804375, 0.0721750, 0.9503041],
+    ])
+    xyz /= np.array([0.95047, 1.0, 1.08883])
+
+    f = np.where(xyz > (6 / 29) ** 3, np.cbrt(xyz), xyz / (3 * (6 / 29) ** 2) + 4 / 29)
+    return np.stack([
+        116 * f[..., 1] - 16,
+        500 * (f[..., 0] - f[..., 1]),
+        200 * (f[..., 1] - f[..., 2]),
+    ], axis=-1)
+
+
+def weighted_kmeans(points, weights, k, iterations=20, seed=0):
+    """가중치 k-means (k-means++ 초기화), (중심, 라벨, 군집별 가중치) 반환"""
+    points = np.asarray(points, dtype=np.float64)
+    weights = np.asarray(weights, dtype=np.float64)
+    k = min(k, len(points))
+    rng = np.random.default_rng(seed)
+
+    centers = [points[int(np.argmax(weights))]]
+    for _ in range(1, k):
+        distances = ((points[:, None, :] - np.array(centers)[None]) ** 2).sum(-1).min(axis=1)
+        probabilities = distances * weights
+        if probabilities.sum() <= 0:
+            break
+        centers.append(points[rng.choice(len(points), p=probabilities / probabilities.sum())])
+    centers = np.array(centers)
+
+    for _ in range(iterations):
+        labels = ((points[:, None, :] - centers[None]) ** 2).sum(-1).argmin(axis=1)
+        cluster_weights = np.bincount(labels, weights=weights, minlength=len(centers))
+        sums = np.stack([
+            np.bincount(labels, weights=weights * points[:, dim], minlength=len(centers))
+            for dim in range(points.shape[1])
+        ], axis=1)
+        updated = np.where(cluster_weights[:, None] > 0, sums / np.maximum(cluster_weights[:, None], 1e-12), centers)
+        if np.allclose(updated, centers):
+            break
+        centers = updated
+
+    labels = ((points[:, None, :] - centers[None]) ** 2).sum(-1).argmin(axis=1)
+    cluster_weights = np.bincount(labels, weights=weights, minlength=len(centers))
+    return centers, labels, cluster_weights
+
+
+class LocalPaletteExtractor:
+    """PDF 벡터 도형/텍스트 색상을 면적 가중 군집화해 color_palette 추출 (API 호출 없음)"""
+
+    def __init__(self, clusters=PALETTE_CLUSTERS, min_background_distance=PALETTE_MIN_BACKGROUND_DISTANCE):
+        self.clusters = clusters
+        self.min_background_distance = min_background_distance
+
+    def collect_colors(self, page):
+        """(rgb, 가중치, 종류) 샘플 수집 - 종류는 background/shape/text"""
+        samples = []
+        page_area = max(page.rect.width * page.rect.height, 1.0)
+
+        for drawing in page.get_drawings():
+            rect = drawing["rect"] & page.rect
+            area = max(rect.width, 0) * max(rect.height, 0)
+
+            fill = drawing.get("fill")
+            if fill and len(fill) == 3 and area > 0:
+                kind = "background" if area >= 0.9 * page_area else "shape"
+                samples.append((fill, area * (drawing.get("fill_opacity") or 1.0), kind))
+
+            stroke = drawing.get("color")
+            if stroke and len(stroke) == 3:
+                length = 2 * (drawing["rect"].width + drawing["rect"].height)
+                samples.append((stroke, length * (drawing.get("width") or 1.0), "shape"))
+
+        for block in page.get_text("dict")["blocks"]:
+            if block.get("type") != 0:
+                continue
+            for line in block["lines"]:
+                for span in line["spans"]:
+                    if not span["text"].strip():
+                        continue
+                    color = span["color"]
+                    rgb = (((color >> 16) & 255) / 255.0, ((color >> 8) & 255) / 255.0, (color & 255) / 255.0)
+                    bbox = fitz.Rect(span["bbox"])
+                    samples.append((rgb, max(bbox.width * bbox.height, 1.0), "text"))
+
+        return samples
+
+    def dominant_color(self, samples):
+        """가중치가 가장 큰 색 (정확한 PDF 색상값 유지)"""
+        totals = {}
+        for rgb, weight, _ in samples:
+            key = rgb_to_hex(rgb)
+            totals[key] = totals.get(key, 0.0) + weight
+        return max(totals, key=totals.get) if totals else None
+
+    def extract(self, doc, page_numbers=None):
+        """문서(또는 지정 페이지)의 primary/secondary/accent/background/text 추출"""
+        if page_numbers is None:
+            page_numbers = range(doc.page_count)
+
+        samples = []
+        for page_num in page_numbers:
+            samples.extend(self.collect_colors(doc[page_num]))
+
+        palette = {}
+
+        background = self.dominant_color([sample for sample in samples if sample[2] == "background"])
+        palette["background"] = background or "#ffffff"
+
+        text = self.dominant_color([sample for sample in samples if sample[2] == "text"])
+        if text:
+            palette["text"] = text
+
+        shapes = [sample for sample in samples if sample[2] == "shape"]
+        if not shapes:
+            return palette
+
+        rgb = np.array([sample[0] for sample in shapes], dtype=np.float64)
+        weights = np.array([sample[1] for sample in shapes], dtype=np.float64)
+        lab = srgb_to_lab(rgb)
+
+        centers, labels, cluster_weights = weighted_kmeans(lab, weights, self.clusters)
+
+        # 배경과 거의 같은 색 군집 제외
+        background_lab = srgb_to_lab(np.array([hex_to_rgb(palette["background"])]))[0]
+        candidates = [
+            index for index in np.argsort(-cluster_weights)
+            if cluster_weights[index] > 0
+            and np.linalg.norm(centers[index] - background_lab) >= self.min_background_distance
+        ]
+        if not candidates:
+            return palette
+
+        # 군집 중심과 가장 가까운 실제 샘플 색을 대표색으로 사용
+        representatives = {}
+        for index in candidates:
+            members = np.flatnonzero(labels == index)
+            nearest = members[np.argmin(((lab[members] - centers[index]) ** 2).sum(-1))]
+            representatives[index] = rgb_to_hex(rgb[nearest])
+
+        palette["primary"] = representatives[candidates[0]]
+        if len(candidates) > 1:
+            palette["secondary"] = representatives[candidates[1]]
+
+        remaining = candidates[2:]
+        if remaining:
+            # 강조색: 남은 군집 중 채도(Lab chroma)가 가장 높은 색
+            chroma = {index: float(np.hypot(centers[index][1], centers[index][2])) for index in remaining}
+            palette["accent"] = representatives[max(chroma, key=chroma.get)]
+
+        return palette
+
+
+class LocalTypographyExtractor:
+    """PDF 텍스트 span의 폰트/크기/위치 통계로 typography 추출 (API 호출 없음)"""
+
+    SUBSET_PREFIX = re.compile(r"^[A-Z]{6}\+")
+    # 소문자 스타일 토큰 -> 표시 이름 (토큰 단위로 비교하므로 semibold가 bold로 잡히지 않음)
+    STYLE_WORDS = {
+        "thin": "Thin", "extralight": "ExtraLight", "ultralight": "ExtraLight", "light": "Light",
+        "regular": "Regular", "medium": "Medium", "semibold": "SemiBold", "demibold": "SemiBold",
+        "bold": "Bold", "extrabold": "ExtraBold", "ultrabold": "ExtraBold", "heavy": "Heavy",
+        "black": "Black", "italic": "Italic", "oblique": "Oblique",
+    }
+    STYLE_PREFIXES = ("semi", "demi", "extra", "ultra")
+    NON_WEIGHT_STYLES = ("Regular", "Italic", "Oblique")
+    # PostScript 이름의 CamelCase 분리(TimesNewRoman -> Times New Roman), 대문자 약어는 유지(ComicSansMS -> Comic Sans MS)
+    CAMEL_CASE_BOUNDARY = re.compile(r"(?<=[a-z])(?=[A-Z])|(?<=[A-Z])(?=[A-Z][a-z])")
+    # 단순 분리로는 실제 패밀리명이 되지 않는 PostScript 이름
+    POSTSCRIPT_FAMILIES = {
+        "DejaVuSans": "DejaVu Sans",
+        "DejaVuSerif": "DejaVu Serif",
+        "DejaVuSansMono": "DejaVu Sans Mono",
+        "NotoSansCJKkr": "Noto Sans CJK KR",
+        "NotoSansKR": "Noto Sans KR",
+        "NotoSerifKR": "Noto Serif KR",
+    }
+
+    def collect_spans(self, page):
+        """공백이 아닌 span의 폰트명, 크기, 굵기, 상대 위치, 글자 수 수집"""
+        spans = []
+        page_height = max(page.rect.height, 1.0)
+
+        for block in page.get_text("dict")["blocks"]:
+            if block.get("type") != 0:
+                continue
+            for line in block["lines"]:
+                for span in line["spans"]:
+                    text = span["text"].strip()
+                    if not text:
+                        continue
+                    spans.append({
+                        "font": span["font"],
+                        "size": round(span["size"] * 2) / 2,
+                        "bold": bool(span["flags"] & 16),
+                        "top": (span["bbox"][1] - page.rect.y0) / page_height,
+                        "relative_size": span["size"] / page_height,
+                        "chars": len(text),
+                    })
+        return spans
+
+    def display_font_name(self, font_name, bold=False):
+        """'ABCDEF+Arial-BoldMT', 'NanumGothicBold' 같은 PDF 폰트명을 'Arial Bold', 'Nanum Gothic Bold' 형태로 변환"""
+        name = self.SUBSET_PREFIX.sub("", font_name)
+        parts = re.split(r"[-,]", name, maxsplit=1)
+        family = re.sub(r"(MT|PS|PSMT)$", "", parts[0])
+        style = re.sub(r"(MT|PS|PSMT)$", "", parts[1]) if len(parts) > 1 else ""
+
+        if family in self.POSTSCRIPT_FAMILIES:
+            family_words = self.POSTSCRIPT_FAMILIES[family].split()
+        else:
+            family_words = self.camel_case_words(family)
+        style_words = self.camel_case_words(style)
+
+        # 하이픈 없이 패밀리명 끝에 붙은 스타일(NanumGothicBold)은 스타일로 이동
+        while len(family_words) > 1 and family_words[-1].lower() in self.STYLE_WORDS:
+            style_words.insert(0, family_words.pop())
+
+        styles = []
+        for word in style_words:
+            display = self.STYLE_WORDS.get(word.lower())
+            if display and display not in styles:
+                styles.append(display)
+        # 굵기 플래그는 폰트명에 굵기(Light, SemiBold 등)가 없을 때만 반영
+        if bold and all(style in self.NON_WEIGHT_STYLES for style in styles):
+            styles.insert(0, "Bold")
+        if len(styles) > 1 and "Regular" in styles:
+            styles.remove("Regular")
+        return " ".join(family_words + (styles or ["Regular"]))
+
+    def camel_case_words(self, text):
+        """CamelCase 분리 후 Semi/Extra 같은 접두어는 다음 단어와 합침 (SemiBold -> SemiBold)"""
+        words = [word for word in re.split(r"[\s_]+", self.CAMEL_CASE_BOUNDARY.sub(" ", text)) if word]
+        merged = []
+        for word in words:
+            if merged and merged[-1].lower() in self.STYLE_PREFIXES and (merged[-1] + word).lower() in self.STYLE_WORDS:
+                merged[-1] += word
+            else:
+                merged.append(word)
+        return merged
+
+    def size_label(self, relative_size, thresholds):
+        large, medium = thresholds
+        if relative_size >= large:
+            return "large"
+        if relative_size >= medium:
+            return "medium"
+        return "small"
+
+    def most_common_font(self, spans):
+        totals = {}
+        for span in spans:
+            key = self.display_font_name(span["font"], span["bold"])
+            totals[key] = totals.get(key, 0) + span["chars"]
+        return max(totals, key=totals.get)
+
+    def extract(self, doc, page_numbers=None):
+        """typography 스키마(title_font, body_font, title_size, body_size) 반환, 텍스트가 없으면 빈 dict"""
+        if page_numbers is None:
+            page_numbers = range(doc.page_count)
+
+        page_spans = [self.collect_spans(doc[page_num]) for page_num in page_numbers]
+        all_spans = [span for spans in page_spans for span in spans]
+        if not all_spans:
+            return {}
+
+        # 본문: 글자 수 기준 가장 많이 쓰인 크기
+        chars_by_size = {}
+        for span in all_spans:
+            chars_by_size[span["size"]] = chars_by_size.get(span["size"], 0) + span["chars"]
+        body_size = max(chars_by_size, key=chars_by_size.get)
+        body_spans = [span for span in all_spans if span["size"] == body_size]
+
+        # 제목: 페이지마다 상단 영역에서 가장 큰 글자 (없으면 페이지 최대 크기)
+        title_spans = []
+        for spans in page_spans:
+            candidates = [span for span in spans if span["size"] >= body_size * TITLE_SIZE_RATIO]
+            top_candidates = [span for span in candidates if span["top"] <= TITLE_REGION_RATIO]
+            candidates = top_candidates or candidates
+            if candidates:
+                largest = max(span["size"] for span in candidates)
+                title_spans.extend(span for span in candidates if span["size"] == largest)
+
+        typography = {
+            "body_font": self.most_common_font(body_spans),
+            "body_size": self.size_label(float(np.median([s["relative_size"] for s in body_spans])), (0.04, 0.028)),
+        }
+        if title_spans:
+            typography["title_font"] = self.most_common_font(title_spans)
+            typography["title_size"] = self.size_label(
+                float(np.median([s["relative_size"] for s in title_spans])), (0.06, 0.04)
+            )
+        return typography
+
+
+class LocalLayoutExtractor:
+    """텍스트 블록 위치로 layout(정렬, 간격, 제목 위치) 추출 (API 호출 없음)"""
+
+    def page_blocks(self, page):
+        """비어 있지 않은 텍스트 블록의 (x0, y0, x1, y1, 대표 글자 크기)"""
+        blocks = []
+        for block in page.get_text("dict")["blocks"]:
+            if block.get("type") != 0:
+                continue
+            sizes = [span["size"] for line in block["lines"] for span in line["spans"] if span["text"].strip()]
+            if sizes:
+                blocks.append((*block["bbox"], max(sizes)))
+        return blocks
+
+    def alignment_of(self, block, page):
+        """블록 하나의 정렬 (가운데/왼쪽/오른쪽)"""
+        x0, _, x1, _, _ = block
+        center_offset = abs((x0 + x1) / 2 - (page.rect.x0 + page.rect.x1) / 2) / max(page.rect.width, 1.0)
+        if center_offset <= LAYOUT_CENTER_TOLERANCE:
+            return "center"
+        return "left" if x0 - page.rect.x0 <= page.rect.x1 - x1 else "right"
+
+    def extract(self, doc, page_numbers=None):
+        """layout 스키마(alignment, spacing, title_position) 반환, 텍스트가 없으면 빈 dict"""
+        if page_numbers is None:
+            page_numbers = range(doc.page_count)
+
+        alignments = {}
+        title_alignments = {}
+        gaps = []
+
+        for page_num in page_numbers:
+            page = doc[page_num]
+            blocks = sorted(self.page_blocks(page), key=lambda block: block[1])
+            if not blocks:
+                continue
+
+            for block in blocks:
+                alignment = self.alignment_of(block, page)
+                alignments[alignment] = alignments.get(alignment, 0) + (block[2] - block[0]) * (block[3] - block[1])
+
+            title = max(blocks, key=lambda block: block[4])
+            title_alignment = self.alignment_of(title, page)
+            title_alignments[title_alignment] = title_alignments.get(title_alignment, 0) + 1
+
+            page_height = max(page.rect.height, 1.0)
+            gaps.extend(
+                max(0.0, below[1] - above[3]) / page_height for above, below in zip(blocks, blocks[1:])
+            )
+
+        if not alignments:
+            return {}
+
+        median_gap = float(np.median(gaps)) if gaps else 0.04
+        spacing = "tight" if median_gap < 0.02 else "loose" if median_gap > 0.06 else "normal"
+        title_alignment = max(title_alignments, key=title_alignments.get)
+
+        return {
+            "alignment": max(alignments, key=alignments.get),
+            "spacing": spacing,
+            "title_position": "top-center" if title_alignment == "center" else "top-left",
+        }
+
+
+class StyleMerger:
+    """페이지별 스타일을 가중 투표로 통합하고 필드별 합의도(0~1) 계산"""
+
+    CATEGORIES = ("color_palette", "typography", "layout", "visual_style")
+
+    def __init__(self, color_match_distance=COLOR_MATCH_DELTA_E, diagram_weight=DIAGRAM_PAGE_WEIGHT):
+        self.color_match_distance = color_match_distance
+        self.diagram_weight = diagram_weight
+
+    def page_weight(self, style, category=None):
+        """도형 포함 여부와 (로컬 분석 시) 필드 신뢰도로 페이지 가중치 계산"""
+        weight = self.diagram_weight if style.get("has_diagrams") else 1.0
+        if category is not None:
+            weight *= style.get("field_confidence", {}).get(category, 1.0)
+        return weight
+
+    def vote_color(self, totals, originals):
+        """지각적으로 가까운 색(ΔE 이내)끼리 표를 합산해 가장 지지가 많은 실제 색 선택"""
+        parsed = {key: hex_to_rgb(key) for key in totals}
+        colors = [key for key, rgb in parsed.items() if rgb is not None]
+        if not colors:
+            return self.vote_categorical(totals, originals)
+
+        lab = srgb_to_lab(np.array([parsed[key] for key in colors]))
+        weight_array = np.fromiter((totals[key] for key in colors), dtype=np.float64, count=len(colors))
+
+        distances = np.linalg.norm(lab[:, None, :] - lab[None, :, :], axis=-1)
+        support = (distances <= self.color_match_distance) @ weight_array
+        # 가까운 색끼리는 지지도가 같으므로 이웃 중 자기 가중치가 가장 큰 색을 대표로 선택 (입력 순서와 무관)
+        top = np.flatnonzero(np.isclose(support, support.max()))
+        best = int(top[np.argmax(weight_array[top])])
+        total_weight = sum(totals.values())
+        return rgb_to_hex(parsed[colors[best]]), float(support[best] / max(total_weight, 1e-12))
+
+    def vote_categorical(self, totals, originals):
+        """정규화 값별 합산 가중치에서 다수결"""
+        winner = max(totals, key=totals.get)
+        return originals[winner], totals[winner] / max(sum(totals.values()), 1e-12)
+
+    def merge(self, styles_list):
+        """(통합 스타일, {"category.field": 합의도}) 반환"""
+        merged = {category: {} for category in self.CATEGORIES}
+        agreement = {}
+
+        # (category, field) -> {대소문자/공백 정규화 값: 합산 가중치}
+        totals = {}
+        originals = {}
+        for style in styles_list:
+            for category in self.CATEGORIES:
+                weight = self.page_weight(style, category)
+                if weight <= 0:
+                    continue
+                for key, value in (style.get(category) or {}).items():
+                    if value in (None, "") or isinstance(value, (dict, list)):
+                        continue
+                    normalized = str(value).strip().lower()
+                    field_totals = totals.setdefault((category, key), {})
+                    field_totals[normalized] = field_totals.get(normalized, 0.0) + weight
+                    originals.setdefault((category, key), {}).setdefault(
+                        normalized, value.strip() if isinstance(value, str) else value
+                    )
+
+        for (category, key), field_totals in totals.items():
+            vote = self.vote_color if category == "color_palette" else self.vote_categorical
+            merged[category][key], agreement[f"{category}.{key}"] = vote(field_totals, originals[(category, key)])
+
+        descriptions = [
+            (self.page_weight(style), style["brand_description"])
+            for style in styles_list if style.get("brand_description")
+        ]
+        # 가중치가 가장 큰 첫 페이지의 설명 사용
+        merged["brand_description"] = max(descriptions, key=lambda item: item[0])[1] if descriptions else ""
+        merged["has_diagrams"] = any(style.get("has_diagrams", False) for style in styles_list)
+
+        return merged, agreement
+
+
+class ConvergenceTracker:
+    """페이지 결과가 도착할 때마다 통합 스타일의 합의도/안정성을 추적"""
+
+    def __init__(self, style_merger, threshold=CONVERGENCE_THRESHOLD,
+                 min_pages=CONVERGENCE_MIN_PAGES, stable_rounds=CONVERGENCE_STABLE_ROUNDS):
+        self.style_merger = style_merger
+        self.threshold = threshold
+        self.min_pages = min_pages
+        self.stable_rounds = stable_rounds
+        self.previous_consensus = None
+        self.unchanged_rounds = 0
+
+    def update(self, styles_list):
+        """현재까지의 페이지 스타일로 수렴 여부 판단"""
+        if self.threshold is None or not styles_list:
+            return False
+
+        merged, agreement = self.style_merger.merge(styles_list)
+        consensus = {category: merged[category] for category in StyleMerger.CATEGORIES}
+
+        if consensus == self.previous_consensus:
+            self.unchanged_rounds += 1
+        else:
+            self.unchanged_rounds = 0
+        self.previous_consensus = consensus
+
+        return (
+            len(styles_list) >= self.min_pages
+            and self.unchanged_rounds >= self.stable_rounds - 1
+            and bool(agreement)
+            and min(agreement.values()) >= self.threshold
+        )
+
+
+class PageSampler:
+    """API 호출 없이 페이지를 점수화해 스타일 정보가 많고 서로 다른 페이지 선택"""
+
+    def __init__(self, diversity=PAGE_SAMPLING_DIVERSITY, thumbnail_zoom=PAGE_SAMPLING_THUMBNAIL_ZOOM):
+        self.diversity = diversity
+        self.thumbnail_zoom = thumbnail_zoom
+
+    def page_features(self, page):
+        """도형 수, 이미지 수, 텍스트 밀도, 색상 히스토그램 추출"""
+        area = max(page.rect.width * page.rect.height, 1.0)
+
+        pix = page.get_pixmap(matrix=fitz.Matrix(self.thumbnail_zoom, self.thumbnail_zoom), alpha=False)
+        pixels = np.frombuffer(pix.samples, dtype=np.uint8).reshape(-1, pix.n)[:, :3]
+
+        # RGB 채널별 4단계 양자화 -> 64칸 히스토그램
+        bins = (pixels // 64).astype(np.int32)
+        histogram = np.bincount(bins[:, 0] * 16 + bins[:, 1] * 4 + bins[:, 2], minlength=64).astype(np.float64)
+        histogram /= max(histogram.sum(), 1.0)
+
+        nonzero = histogram[histogram > 0]
+        color_entropy = float(-(nonzero * np.log2(nonzero)).sum())
+
+        return {
+            "drawings": len(page.get_drawings()),
+            "images": len(page.get_images(full=False)),
+            "text_density": len(page.get_text("text")) / area,
+            "color_entropy": color_entropy,
+            "histogram": histogram,
+        }
+
+    def score_pages(self, features):
+        """페이지별 스타일 정보량 점수 (0~1 정규화 특성의 가중합)"""
+        def normalized(values):
+            values = np.asarray(values, dtype=np.float64)
+            peak = values.max() if len(values) else 0.0
+            return values / peak if peak > 0 else np.zeros_like(values)
+
+        drawings = normalized([np.log1p(f["drawings"]) for f in features])
+        images = normalized([min(f["images"], 3) for f in features])
+        color = normalized([f["color_entropy"] for f in features])
+        text = normalized([f["text_density"] for f in features])
+
+        # 도형/색상이 많을수록 가산, 글만 빽빽한 페이지(목차 등)는 감점
+        return 0.45 * drawings + 0.15 * images + 0.3 * color - 0.1 * text
+
+    def select(self, doc, max_pages):
+        """MMR 방식으로 점수가 높고 서로 다른 페이지 인덱스를 페이지 순서대로 반환"""
+        if doc.page_count <= max_pages:
+            return list(range(doc.page_count))
+
+        features = [self.page_features(doc[page_num]) for page_num in range(doc.page_count)]
+        scores = self.score_pages(features)
+
+        histograms = np.stack([f["histogram"] for f in features])
+        histograms /= np.maximum(np.linalg.norm(histograms, axis=1, keepdims=True), 1e-12)
+        similarity = histograms @ histograms.T
+
+        selected = [int(np.argmax(scores))]
+        max_similarity = similarity[selected[0]].copy()
+
+        while len(selected) < max_pages:
+            mmr = (1 - self.diversity) * scores - self.diversity * max_similarity
+            mmr[selected] = -np.inf
+            next_page = int(np.argmax(mmr))
+            selected.append(next_page)
+            max_similarity = np.maximum(max_similarity, similarity[next_page])
+
+        return sorted(selected)
 
 
 class PPTStyleAnalyzer:
-    def __init__(self, openai_key):
-        self.openai_key = openai_key
-        self.openai_url = "https://api.openai.com/v1/chat/completions"
+    def __init__(self, openai_key, http_client=None, max_concurrency=MAX_CONCURRENT_PAGES,
+                 style_cache=None, page_cache=None, render_policy=None, page_sampler=None,
+                 palette_source=PALETTE_SOURCE, palette_extractor=None,
+                 typography_source=TYPOGRAPHY_SOURCE, typography_extractor=None,
+                 analysis_mode=ANALYSIS_MODE, layout_extractor=None, batch_size=PAGE_BATCH_SIZE,
+                 style_merger=None, convergence_threshold=CONVERGENCE_THRESHOLD, async_client=None):
+        if palette_source not in ("vision", "local", "seed"):
+            raise ValueError(f"알 수 없는 palette_source: {palette_source}")
+        if typography_source not in ("vision", "local", "seed"):
+            raise ValueError(f"알 수 없는 typography_source: {typography_source}")
+        if analysis_mode not in ("vision", "hybrid"):
+            raise ValueError(f"알 수 없는 analysis_mode: {analysis_mode}")
+
+        self.http_client = http_client or OpenAIClient(openai_key)
+        self.async_client = async_client
+        self.palette_source = palette_source
+        self.palette_extractor = palette_extractor or LocalPaletteExtractor()
+        self.typography_source = typography_source
+        self.typography_extractor = typography_extractor or LocalTypographyExtractor()
+        self.analysis_mode = analysis_mode
+        self.layout_extractor = layout_extractor or LocalLayoutExtractor()
+        self.page_sampler = page_sampler or PageSampler()
+        self.render_policy = render_policy or RenderPolicy()
+        self.max_concurrency = max(1, max_concurrency)
+        self.batch_size = max(1, batch_size)
+        self.style_merger = style_merger or StyleMerger()
+        self.convergence_threshold = convergence_threshold
+        self.style_cache = style_cache or SQLiteCache(
+            CACHE_PATH, "style",
+            max_entries=STYLE_CACHE_MAX_ENTRIES,
+            ttl_seconds=STYLE_CACHE_TTL_SECONDS
+        )
+        self.page_cache = page_cache or SQLiteCache(
+            CACHE_PATH, "page",
+            max_entries=PAGE_CACHE_MAX_ENTRIES,
+            ttl_seconds=PAGE_CACHE_TTL_SECONDS
+        )
 
+    @TELEMETRY.traced("style_analysis")
     def analyze_pdf_with_gpt4v(self, pdf_file):
         """PDF를 페이지별 이미지로 변환 후 분석"""
         try:
             pdf_bytes = pdf_file.read()
             pdf_file.seek(0)  
-            doc = fitz.open(stream=pdf_bytes, filetype="pdf")
-            all_styles = []
 
-            st.info(f"PDF에서 총 {doc.page_count}페이지를 발견했습니다.")
+            analysis = self.prepare_analysis(pdf_bytes)
+            if analysis["cached_style"]:
+                return analysis["cached_style"]
+
+            analysis["api_calls"], analysis["failed_pages"] = self.run_page_analyses(
+                analysis["page_images"], analysis["page_results"]
+            )
+            return self.finish_analysis(analysis)
+
+        except Exception as e:
+            notify("error", f"PDF 처리 오류: {str(e)}")
+            import traceback
+            st.error(f"상세 오류: {traceback.format_exc()}")
+            return None
+
+    @TELEMETRY.traced("style_analysis")
+    async def analyze_pdf_async(self, pdf_bytes):
+        """analyze_pdf_with_gpt4v의 asyncio 버전 (렌더링/로컬 분석은 작업 스레드에서 실행)"""
+        try:
+            analysis = await asyncio.to_thread(self.prepare_analysis, pdf_bytes)
+            if analysis["cached_style"]:
+                return analysis["cached_style"]
+
+            analysis["api_calls"], analysis["failed_pages"] = await self.run_page_analyses_async(
+                analysis["page_images"], analysis["page_results"]
+            )
+            # 스타일 캐시 저장(SQLite)이 이벤트 루프를 막지 않도록 작업 스레드에서 실행
+            return await asyncio.to_thread(self.finish_analysis, analysis)
+
+        except Exception as e:
+            notify("error", f"PDF 처리 오류: {str(e)}")
+            return None
+
+    def prepare_analysis(self, pdf_bytes):
+        """API 호출 전 단계 (캐시 조회, 페이지 선택, 로컬 분석, 렌더링)"""
+        cache_key = make_cache_key(
+            hashlib.sha256(pdf_bytes).hexdigest(), OPENAI_MODEL, STYLE_PROMPT_VERSION,
+            MAX_ANALYSIS_PAGES, PAGE_SAMPLING_VERSION, self.palette_source, self.typography_source,
+            self.analysis_mode
+        )
+        cached_style = self.style_cache.get(cache_key)
+        if cached_style:
+            st.info("이전에 분석한 PDF입니다. 캐시된 스타일을 사용합니다.")
+            return {"cache_key": cache_key, "cached_style": cached_style}
+
+        doc = fitz.open(stream=pdf_bytes, filetype="pdf")
+
+        st.info(f"PDF에서 총 {doc.page_count}페이지를 발견했습니다.")
+
+        selected_pages = self.page_sampler.select(doc, MAX_ANALYSIS_PAGES)
+        if len(selected_pages) < doc.page_count:
+            st.write(
+                "스타일 정보가 많은 페이지를 선택했습니다: "
+                + ", ".join(str(page_num + 1) for page_num in selected_pages)
+            )
+
+        page_results = {}
+        vision_pages = selected_pages
+        if self.analysis_mode == "hybrid":
+            vision_pages = self.analyze_pages_locally(doc, selected_pages, page_results)
+
+        page_images = self.prepare_page_images(doc, vision_pages, page_results)
+
+        local_style = {}
+        if self.palette_source == "local":
+            local_style["color_palette"] = self.palette_extractor.extract(doc, selected_pages)
+        if self.typography_source == "local":
+            local_style["typography"] = self.typography_extractor.extract(doc, selected_pages)
+
+        doc.close()
+
+        return {
+            "cache_key": cache_key,
+            "cached_style": None,
+            "selected_pages": selected_pages,
+            "page_results": page_results,
+            "page_images": page_images,
+            "local_style": local_style,
+        }
+
+    def finish_analysis(self, analysis):
+        """페이지 결과 통합, 로컬 추출값 반영, 스타일 캐시 저장"""
+        page_results = analysis["page_results"]
+
+        if self.analysis_mode == "hybrid":
+            vision_pages = len(analysis["page_images"])
+            avoided = len(analysis["selected_pages"]) - vision_pages
+            st.info(
+                f"API 호출 {analysis['api_calls']}회 (페이지 {vision_pages}개), "
+                f"로컬 분석/캐시로 {avoided}개 페이지 절약"
+            )
+
+        # 완료 순서와 무관하게 페이지 순서대로 정렬
+        all_styles = [page_results[page_num] for page_num in sorted(page_results) if page_results[page_num]]
+
+        if not all_styles:
+            notify("error", "PDF에서 분석 가능한 스타일을 찾을 수 없습니다.")
+            return None
+
+        unified_style = self.merge_styles(all_styles)
+
+        # PDF에서 직접 얻은 색상/폰트 값이 모델 추정값보다 우선
+        for category, local_values in analysis["local_style"].items():
+            if local_values:
+                unified_style[category] = {**unified_style.get(category, {}), **local_values}
+                st.write(f"PDF 데이터에서 {category}를 추출했습니다: {local_values}")
+
+        if analysis["failed_pages"]:
+            # 장애/한도 초과로 빠진 페이지가 있는 결과는 이번 호출에만 쓰고, 복구 후 다시 분석하도록 캐시하지 않음
+            notify(
+                "warning",
+                f"{analysis['failed_pages']}개 페이지 분석에 실패해 이번 결과는 캐시에 저장하지 않습니다."
+            )
+        else:
+            self.style_cache.set(analysis["cache_key"], unified_style)
+        st.success(f"총 {len(all_styles)}개 페이지의 스타일을 통합했습니다.")
+        return unified_style
+
+    def prepare_page_images(self, doc, page_numbers, page_results):
+        """페이지를 렌더링해 분석 대상 목록 반환 (캐시된 페이지는 page_results에 바로 기록)"""
+        # PyMuPDF 문서 객체는 스레드 안전하지 않으므로 렌더링은 메인 스레드에서 수행
+        # 파이프라인이 세션 간에 공유되므로 호출별 상태는 인스턴스에 두지 않음
+        page_images = []
+        all_render_stats = []
+        for page_num in page_numbers:
+            st.write(f"페이지 {page_num + 1} 렌더링 중...")
+
+            page = doc[page_num]
+
+            img_data, render_stats = self.render_policy.render(page)
+            all_render_stats.append(render_stats)
+
+            st.write(
+                f"페이지 {page_num + 1} 이미지: {render_stats['width']}x{render_stats['height']} "
+                f"{self.render_policy.image_format}, {len(img_data)} bytes "
+                f"(기존 2x 렌더 대비 픽셀 수 {render_stats['legacy_pixel_savings']:.0%} 절감)"
+            )
+
+            local_hints = {}
+            if self.palette_source == "seed":
+                local_hints["color_palette"] = self.palette_extractor.extract(doc, [page_num])
+            if self.typography_source == "seed":
+                page_typography = self.typography_extractor.extract(doc, [page_num])
+                if page_typography:
+                    local_hints["typography"] = page_typography
+
+            # 렌더링 결과가 같은 페이지는 이전 분석 결과를 재사용
+            page_key = self.page_cache_key(img_data, local_hints)
+            cached_page_style = self.page_cache.get(page_key)
+            if cached_page_style:
+                page_results[page_num + 1] = cached_page_style
+                st.write(f"페이지 {page_num + 1} 변경 없음 - 캐시된 분석 결과 사용")
+                continue
+
+            base64_image = base64.b64encode(img_data).decode()
+            page_images.append((page_num + 1, base64_image, page_key, local_hints))
+
+        if all_render_stats:
+            total_bytes = sum(stats["bytes"] for stats in all_render_stats)
+            total_base64 = sum(stats["base64_bytes"] for stats in all_render_stats)
+            st.write(f"렌더링 이미지 총 {total_bytes / 1024:.0f} KB (base64 전송 {total_base64 / 1024:.0f} KB)")
+
+        return page_images
+
+    def make_batches(self, page_images):
+        batches = [
+            page_images[start:start + self.batch_size]
+            for start in range(0, len(page_images), self.batch_size)
+        ]
+        st.write(
+            f"{len(page_images)}개 페이지를 {len(batches)}개 요청으로 나눠 "
+            f"최대 {self.max_concurrency}개씩 동시에 분석합니다..."
+        )
+        return batches
+
+    def cache_page_results(self, results, page_keys):
+        for page_num, page_style in results.items():
+            if page_style:
+                self.page_cache.set(page_keys[page_num], page_style)
+
+    def record_page_results(self, results, page_results):
+        """성공한 페이지를 page_results에 기록하고 실패한 페이지 수 반환"""
+        failed = 0
+        for page_num, page_style in results.items():
+            if page_style:
+                page_results[page_num] = page_style
+                st.success(f"페이지 {page_num} 분석 완료")
+            else:
+                failed += 1
+                notify("warning", f"페이지 {page_num} 분석 실패")
+        return failed
+
+    def first_wave_size(self, batches, tracker):
+        """처음에 보낼 묶음 수 - 수렴 판단에 필요한 페이지 수만큼만 보내고, 수렴하지 않으면 동시성 한도까지 채움"""
+        if tracker.threshold is None:
+            return len(batches)
+
+        pages = 0
+        for count, batch in enumerate(batches, 1):
+            pages += len(batch)
+            if pages >= tracker.min_pages:
+                break
+        return min(count, self.max_concurrency)
+
+    def run_page_analyses(self, page_images, page_results):
+        """렌더링된 페이지들을 묶음 단위로, 제한된 동시성으로 분석해 page_results에 기록하고 (API 호출 수, 실패 페이지 수) 반환"""
+        if not page_images:
+            return 0, 0
+
+        batches = self.make_batches(page_images)
+        page_keys = {page_num: page_key for page_num, _, page_key, _ in page_images}
+
+        def cache_results(future):
+            # 조기 종료 후 늦게 끝난 요청의 결과도 다음 업로드를 위해 저장
+            if future.cancelled() or future.exception() is not None:
+                return
+            self.cache_page_results(future.result()[0], page_keys)
+
+        tracker = ConvergenceTracker(self.style_merger, threshold=self.convergence_threshold)
+        queued = list(batches)
+
+        api_calls = 0
+        failed_pages = 0
+        executor = create_thread_pool(self.max_concurrency)
+
+        def submit_next():
+            future = submit_in_context(executor, self.analyze_page_group, queued.pop(0))
+            future.add_done_callback(cache_results)
+            return future
+
+        try:
+            # 아직 보내지 않은 묶음만 조기 종료 시 비용을 아낄 수 있으므로 한 번에 모두 보내지 않음
+            pending = {submit_next() for _ in range(self.first_wave_size(batches, tracker))}
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+
+                converged = False
+                for future in done:
+                    results, group_calls = future.result()
+                    api_calls += group_calls
+                    failed_pages += self.record_page_results(results, page_results)
+                    if (pending or queued) and tracker.update([page_results[n] for n in sorted(page_results)]):
+                        converged = True
+
+                if converged:
+                    st.info(
+                        f"스타일이 수렴해 분석을 조기 종료합니다 "
+                        f"(보내지 않은 요청 {len(queued)}개 생략, 진행 중 요청 {len(pending)}개 결과 미사용)"
+                    )
+                    break
+
+                # 수렴 판단 후 아직 수렴하지 않았으면 동시성 한도까지 다시 채움
+                while queued and len(pending) < self.max_concurrency:
+                    pending.add(submit_next())
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        return api_calls, failed_pages
+
+    async def run_page_analyses_async(self, page_images, page_results):
+        """run_page_analyses의 asyncio 버전 - 수렴 시 진행 중인 요청까지 취소"""
+        if not page_images:
+            return 0, 0
+
+        batches = self.make_batches(page_images)
+        page_keys = {page_num: page_key for page_num, _, page_key, _ in page_images}
+        tracker = ConvergenceTracker(self.style_merger, threshold=self.convergence_threshold)
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        queued = list(batches)
+
+        async def analyze_group(batch):
+            async with semaphore:
+                results, group_calls = await self.analyze_page_group_async(batch)
+            await asyncio.to_thread(self.cache_page_results, results, page_keys)
+            return results, group_calls
+
+        def submit_next():
+            return asyncio.create_task(analyze_group(queued.pop(0)))
+
+        api_calls = 0
+        failed_pages = 0
+        pending = {submit_next() for _ in range(self.first_wave_size(batches, tracker))}
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+
+                converged = False
+                for task in done:
+                    results, group_calls = task.result()
+                    api_calls += group_calls
+                    failed_pages += self.record_page_results(results, page_results)
+                    if (pending or queued) and tracker.update([page_results[n] for n in sorted(page_results)]):
+                        converged = True
+
+                if converged:
+                    st.info(
+                        f"스타일이 수렴해 분석을 조기 종료합니다 "
+                        f"(보내지 않은 요청 {len(queued)}개 생략, 진행 중 요청 {len(pending)}개 취소)"
+                    )
+                    break
+
+                # 수렴 판단 후 아직 수렴하지 않았으면 동시성 한도까지 다시 채움
+                while queued and len(pending) < self.max_concurrency:
+                    pending.add(submit_next())
+        finally:
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+        return api_calls, failed_pages
+
+    def analyze_page_group(self, batch):
+        """페이지 묶음 분석해 ({페이지: 스타일}, API 호출 수) 반환 - 일괄 응답을 해석하지 못하면 페이지별 요청으로 대체"""
+        mime_type = self.render_policy.mime_type
+        api_calls = 0
+
+        if len(batch) > 1:
+            results = self.analyze_page_batch(batch, mime_type)
+            api_calls += 1
+            if results is not None:
+                return results, api_calls
+
+            page_list = ", ".join(str(page_num) for page_num, _, _, _ in batch)
+            notify("warning", f"페이지 {page_list} 일괄 분석 실패 - 페이지별로 다시 분석합니다")
+
+        results = {
+            page_num: self.analyze_page_image(base64_image, page_num, mime_type, local_hints)
+            for page_num, base64_image, _, local_hints in batch
+        }
+        return results, api_calls + len(batch)
+
+    async def analyze_page_group_async(self, batch):
+        """analyze_page_group의 asyncio 버전"""
+        mime_type = self.render_policy.mime_type
+        api_calls = 0
+
+        if len(batch) > 1:
+            results = await self.analyze_page_batch_async(batch, mime_type)
+            api_calls += 1
+            if results is not None:
+                return results, api_calls
+
+            page_list = ", ".join(str(page_num) for page_num, _, _, _ in batch)
+            notify("warning", f"페이지 {page_list} 일괄 분석 실패 - 페이지별로 다시 분석합니다")
+
+        styles = await asyncio.gather(*[
+            self.analyze_page_image_async(base64_image, page_num, mime_type, local_hints)
+            for page_num, base64_image, _, local_hints in batch
+        ])
+        results = {page_num: style for (page_num, _, _, _), style in zip(batch, styles)}
+        return results, api_calls + len(batch)
+
+    @TELEMETRY.traced("page_analysis")
+    def analyze_page_batch(self, batch, mime_type):
+        """여러 페이지 이미지를 한 번의 요청으로 분석해 {페이지: 스타일} 반환, 실패 시 None"""
+        payload = self.build_batch_payload(batch, mime_type)
+
+        try:
+            response = self.http_client.post_chat(payload)
+            return self.parse_batch_response(response, batch)
+        except Exception as e:
+            notify("warning", f"일괄 분석 오류: {str(e)}")
+            return None
+
+    @TELEMETRY.traced("page_analysis")
+    async def analyze_page_batch_async(self, batch, mime_type):
+        """analyze_page_batch의 asyncio 버전"""
+        payload = self.build_batch_payload(batch, mime_type)
+
+        try:
+            response = await self.async_client.post_chat(payload)
+            return self.parse_batch_response(response, batch)
+        except Exception as e:
+            notify("warning", f"일괄 분석 오류: {str(e)}")
+            return None
+
+    def build_batch_payload(self, batch, mime_type):
+        page_nums = [page_num for page_num, _, _, _ in batch]
+
+        content = [
+            {
+                "type": "text",
+                "text": f"""Analyze the following {len(batch)} presentation slides (pages {', '.join(map(str, page_nums))}) and extract design patterns from diagrams, charts, and visual elements on each page.
+
+Look for:
+- Color schemes used in diagrams/charts
+- Typography styles
+- Layout patterns
+- Visual design elements
+
+Return a JSON array with exactly {len(batch)} objects, one per page in the order given. Each object must use the following format plus a "page" field holding its page number:
+
+{PAGE_STYLE_SCHEMA}
+
+Respond with ONLY the JSON array, no other text."""
+            }
+        ]
+
+        for page_num, base64_image, _, local_hints in batch:
+            label = f"Page {page_num}:"
+            if local_hints:
+                label += (
+                    " values measured directly from this page's PDF data (exact colors and embedded font names; "
+                    f"prefer them where they fit): {json.dumps(local_hints)}"
+                )
+            content.append({"type": "text", "text": label})
+            content.append({
+                "type": "image_url",
+                "image_url": {
+                    "url": f"data:{mime_type};base64,{base64_image}"
+                }
+            })
 
-            max_pages = min(10, doc.page_count)
+        return {
+            "model": OPENAI_MODEL,
+            "messages": [
+                {
+                    "role": "user",
+                    "content": content
+                }
+            ],
+            "max_tokens": 1000 * len(batch)
+        }
+
+    def parse_batch_response(self, response, batch):
+        """일괄 분석 응답(requests/httpx)을 {페이지: 스타일}로 변환, 형식이 맞지 않으면 None"""
+        page_nums = [page_num for page_num, _, _, _ in batch]
+
+        if response.status_code != 200:
+            notify("warning", f"일괄 분석 실패: {response.status_code} - {response.text}")
+            return None
+
+        result = response.json()
+        response_text = result['choices'][0]['message']['content']
+        response_text = response_text.replace('```json', '').replace('```', '').strip()
+        styles = json.loads(response_text)
+
+        if isinstance(styles, dict):
+            styles = styles.get("pages")
+        if not isinstance(styles, list) or len(styles) != len(batch) or not all(isinstance(s, dict) for s in styles):
+            return None
+
+        # page 필드가 요청한 페이지와 정확히 일치하면 그것으로, 아니면 순서로 대응
+        reported = [style.get("page") for style in styles]
+        if sorted(reported, key=str) != sorted(page_nums, key=str):
+            reported = page_nums
+
+        return {
+            page_num: {key: value for key, value in style.items() if key != "page"}
+            for page_num, style in zip(reported, styles)
+        }
 
-            for page_num in range(max_pages):
-                st.write(f"페이지 {page_num + 1} 분석 중...")
+    def local_page_style(self, doc, page_num):
+        """단일 페이지의 로컬 추출 결과와 필드별 신뢰도(0~1) 반환"""
+        page = doc[page_num]
+        page_area = max(page.rect.width * page.rect.height, 1.0)
 
-                page = doc[page_num]
+        palette = self.palette_extractor.extract(doc, [page_num])
+        typography = self.typography_extractor.extract(doc, [page_num])
+        layout = self.layout_extractor.extract(doc, [page_num])
 
-                mat = fitz.Matrix(2.0, 2.0)
-                pix = page.get_pixmap(matrix=mat)
+        drawing_count = len(page.get_drawings())
+        text_blocks = [block for block in page.get_text("blocks") if block[6] == 0 and block[4].strip()]
+        image_area = sum(
+            (fitz.Rect(info["bbox"]) & page.rect).get_area() for info in page.get_image_info()
+        )
+        # 래스터 이미지 위주 페이지는 벡터/텍스트 데이터로 스타일을 알 수 없음
+        vector_share = 1.0 - min(image_area / page_area, 1.0)
+
+        found_colors = sum(1 for key in ("primary", "secondary", "accent") if key in palette)
+        confidence = {
+            "color_palette": vector_share * found_colors / 3,
+            "typography": vector_share * (1.0 if "title_font" in typography else 0.6 if typography else 0.0),
+            "layout": vector_share * min(len(text_blocks) / 3, 1.0) if layout else 0.0,
+        }
 
-                img_data = pix.tobytes("png")
+        style = {
+            "color_palette": palette,
+            "typography": typography,
+            "layout": layout,
+            "has_diagrams": drawing_count >= HYBRID_DIAGRAM_MIN_DRAWINGS,
+            "field_confidence": confidence,
+        }
+        return style, confidence, drawing_count
 
-                st.write(f"페이지 {page_num + 1} 이미지 크기: {len(img_data)} bytes")
+    def analyze_pages_locally(self, doc, page_numbers, page_results):
+        """hybrid 모드: 로컬 추출 후 신뢰도가 낮은 페이지와 시각 스타일 표본 페이지만 비전 분석 대상으로 반환"""
+        vision_pages = []
+        confident_pages = []
 
-                base64_image = base64.b64encode(img_data).decode()
+        for page_num in page_numbers:
+            style, confidence, drawing_count = self.local_page_style(doc, page_num)
+            low_fields = [field for field, score in confidence.items() if score < HYBRID_CONFIDENCE_THRESHOLD]
 
-                page_style = self.analyze_page_image(base64_image, page_num + 1)
+            if low_fields:
+                st.write(f"페이지 {page_num + 1} 로컬 신뢰도 낮음({', '.join(low_fields)}) - 비전 분석 필요")
+                vision_pages.append(page_num)
+            else:
+                page_results[page_num + 1] = style
+                confident_pages.append((drawing_count, page_num))
+
+        # visual_style/brand_description은 로컬로 알 수 없으므로 도형이 많은 페이지 몇 장은 비전 분석
+        confident_pages.sort(key=lambda item: (-item[0], item[1]))
+        for _, page_num in confident_pages[:max(0, HYBRID_MIN_VISION_PAGES - len(vision_pages))]:
+            vision_pages.append(page_num)
+            page_results.pop(page_num + 1, None)
+
+        st.write(
+            f"로컬 분석 {len(page_numbers) - len(vision_pages)}페이지, "
+            f"비전 분석 대상 {len(vision_pages)}페이지"
+        )
+        return sorted(vision_pages)
 
-                if page_style:
-                    all_styles.append(page_style)
-                    st.success(f"페이지 {page_num + 1} 분석 완료")
-                else:
-                    st.warning(f"페이지 {page_num + 1} 분석 실패")
+    def page_cache_key(self, img_data, local_hints=None):
+        """렌더링된 페이지 이미지 기반 캐시 키"""
+        return make_cache_key(
+            hashlib.sha256(img_data).hexdigest(), OPENAI_MODEL, STYLE_PROMPT_VERSION, local_hints
+        )
 
-            doc.close()
+    @TELEMETRY.traced("page_analysis")
+    def analyze_page_image(self, base64_image, page_num, mime_type="image/png", local_hints=None):
+        """개별 페이지 이미지 분석"""
+        payload = self.build_page_payload(base64_image, page_num, mime_type, local_hints)
 
-            if not all_styles:
-                st.error("PDF에서 분석 가능한 스타일을 찾을 수 없습니다.")
-                return None
+        try:
+            response = self.http_client.post_chat(payload)
+            return self.parse_page_response(response, page_num)
+        except Exception as e:
+            notify("warning", f"페이지 {page_num} 분석 오류: {str(e)}")
+            return None
 
-            unified_style = self.merge_styles(all_styles)
-            st.success(f"총 {len(all_styles)}개 페이지의 스타일을 통합했습니다.")
-            return unified_style
+    @TELEMETRY.traced("page_analysis")
+    async def analyze_page_image_async(self, base64_image, page_num, mime_type="image/png", local_hints=None):
+        """analyze_page_image의 asyncio 버전"""
+        payload = self.build_page_payload(base64_image, page_num, mime_type, local_hints)
 
+        try:
+            response = await self.async_client.post_chat(payload)
+            return self.parse_page_response(response, page_num)
         except Exception as e:
-            st.error(f"PDF 처리 오류: {str(e)}")
-            import traceback
-            st.error(f"상세 오류: {traceback.format_exc()}")
+            notify("warning", f"페이지 {page_num} 분석 오류: {str(e)}")
             return None
 
-    def analyze_page_image(self, base64_image, page_num):
-        """개별 페이지 이미지 분석"""
-        headers = {
-            "Content-Type": "application/json; charset=utf-8",
-            "Authorization": f"Bearer {self.openai_key}"
-        }
+    def build_page_payload(self, base64_image, page_num, mime_type, local_hints):
+        local_hint_text = ""
+        if local_hints:
+            local_hint_text = (
+                "\nValues measured directly from this page's PDF data (exact colors and embedded font names; "
+                f"prefer them where they fit): {json.dumps(local_hints)}\n"
+            )
 
-        payload = {
-            "model": "gpt-4o",
+        return {
+            "model": OPENAI_MODEL,
             "messages": [
                 {
                     "role": "user",
@@ -95,43 +2351,17 @@ Look for:
 - Typography styles
 - Layout patterns
 - Visual design elements
-
+{local_hint_text}
 Return style information in the following JSON format only:
 
-{{
-  "color_palette": {{
-    "primary": "#color_code",
-    "secondary": "#color_code",
-    "accent": "#color_code", 
-    "background": "#color_code",
-    "text": "#color_code"
-  }},
-  "typography": {{
-    "title_font": "estimated_font_name",
-    "body_font": "estimated_font_name",
-    "title_size": "large/medium/small",
-    "body_size": "large/medium/small"
-  }},
-  "layout": {{
-    "alignment": "center/left/right",
-    "spacing": "tight/normal/loose",
-    "title_position": "top-center/top-left"
-  }},
-  "visual_style": {{
-    "design_approach": "minimalist/corporate/academic",
-    "border_style": "none/thin/thick",
-    "shadow_style": "none/subtle/prominent"
-  }},
-  "brand_description": "Overall style description in one sentence",
-  "has_diagrams": true/false
-}}
+{PAGE_STYLE_SCHEMA}
 
 Respond with ONLY the JSON, no other text."""
                         },
                         {
                             "type": "image_url",
                             "image_url": {
-                                "url": f"data:image/png;base64,{base64_image}"
+                                "url": f"data:{mime_type};base64,{base64_image}"
                             }
                         }
                     ]
@@ -140,64 +2370,31 @@ Respond with ONLY the JSON, no other text."""
             "max_tokens": 1000
         }
 
-        try:
-            response = requests.post(self.openai_url, headers=headers, json=payload)
-
-            if response.status_code == 200:
-                result = response.json()
-                content = result['choices'][0]['message']['content']
+    def parse_page_response(self, response, page_num):
+        """단일 페이지 분석 응답(requests/httpx)에서 스타일 추출"""
+        if response.status_code == 200:
+            result = response.json()
+            content = result['choices'][0]['message']['content']
 
-                content = content.replace('```json', '').replace('```', '').strip()
+            content = content.replace('```json', '').replace('```', '').strip()
 
-                try:
-                    style_data = json.loads(content)
-                    return style_data
-                except json.JSONDecodeError as e:
-                    st.warning(f"페이지 {page_num} JSON 파싱 오류: {content[:200]}...")
-                    return None
-            else:
-                st.warning(f"페이지 {page_num} 분석 실패: {response.status_code} - {response.text}")
+            try:
+                style_data = json.loads(content)
+                return style_data
+            except json.JSONDecodeError as e:
+                notify("warning", f"페이지 {page_num} JSON 파싱 오류: {content[:200]}...")
                 return None
-
-        except Exception as e:
-            st.warning(f"페이지 {page_num} 분석 오류: {str(e)}")
+        else:
+            notify("warning", f"페이지 {page_num} 분석 실패: {response.status_code} - {response.text}")
             return None
 
     def merge_styles(self, styles_list):
-        """여러 페이지의 스타일을 통합"""
+        """여러 페이지의 스타일을 가중 투표로 통합 (field_agreement에 필드별 합의도 포함)"""
         if not styles_list:
             return None
 
-        if len(styles_list) == 1:
-            return styles_list[0]
-
-        merged_style = {
-            "color_palette": {},
-            "typography": {},
-            "layout": {},
-            "visual_style": {},
-            "brand_description": "",
-            "has_diagrams": any(style.get("has_diagrams", False) for style in styles_list)
-        }
-
-        for style in styles_list:
-            if style.get("color_palette"):
-                for key, value in style["color_palette"].items():
-                    if key not in merged_style["color_palette"] and value:
-                        merged_style["color_palette"][key] = value
-
-        for category in ["typography", "layout", "visual_style"]:
-            for style in styles_list:
-                if style.get(category):
-                    for key, value in style[category].items():
-                        if key not in merged_style[category] and value:
-                            merged_style[category][key] = value
-
-        for style in styles_list:
-            if style.get("brand_description") and not merged_style["brand_description"]:
-                merged_style["brand_description"] = style["brand_description"]
-                break
-
+        merged_style, agreement = self.style_merger.merge(styles_list)
+        merged_style["field_agreement"] = {key: round(score, 3) for key, score in agreement.items()}
         return merged_style
 
     def analyze_ppt_style_single_image(self, image_data):
@@ -208,13 +2405,8 @@ Respond with ONLY the JSON, no other text."""
             base64_image = base64.b64encode(image_data.read()).decode()
             image_data.seek(0)
 
-        headers = {
-            "Content-Type": "application/json; charset=utf-8",
-            "Authorization": f"Bearer {self.openai_key}"
-        }
-
         payload = {
-            "model": "gpt-4o",
+            "model": OPENAI_MODEL,
             "messages": [
                 {
                     "role": "user",
@@ -267,7 +2459,7 @@ Respond with ONLY the JSON, no other text."""
         }
 
         try:
-            response = requests.post(self.openai_url, headers=headers, json=payload)
+            response = self.http_client.post_chat(payload)
 
             if response.status_code == 200:
                 result = response.json()
@@ -276,26 +2468,74 @@ Respond with ONLY the JSON, no other text."""
                 style_data = json.loads(content)
                 return style_data
             else:
-                st.error(f"스타일 분석 실패: {response.status_code}")
+                notify("error", f"스타일 분석 실패: {response.status_code}")
                 return None
         except Exception as e:
-            st.error(f"스타일 분석 오류: {str(e)}")
+            notify("error", f"스타일 분석 오류: {str(e)}")
             return None
 
 
 class NaturalLanguageProcessor:
-    def __init__(self, openai_key):
-        self.openai_key = openai_key
-        self.openai_url = "https://api.openai.com/v1/chat/completions"
+    def __init__(self, openai_key, http_client=None, response_cache=None, semantic_cache=None,
+                 use_semantic_cache=USE_SEMANTIC_CACHE, async_client=None):
+        self.http_client = http_client or OpenAIClient(openai_key)
+        self.async_client = async_client
+        self.semantic_cache = semantic_cache or SHARED_SEMANTIC_CACHE
+        self.use_semantic_cache = use_semantic_cache
+        self.response_cache = response_cache or SQLiteCache(
+            CACHE_PATH, "nlp",
+            max_entries=NLP_CACHE_MAX_ENTRIES,
+            ttl_seconds=NLP_CACHE_TTL_SECONDS
+        )
 
+    @TELEMETRY.traced("request_parsing")
     def process_user_request(self, user_input):
-        headers = {
-            "Content-Type": "application/json; charset=utf-8",
-            "Authorization": f"Bearer {self.openai_key}"
-        }
+        cache_key, cached_content = self.lookup_cached(user_input)
+        if cached_content:
+            return cached_content
 
-        payload = {
-            "model": "gpt-4o",
+        try:
+            response = self.http_client.post_chat(self.build_payload(user_input))
+            return self.parse_response(response, cache_key, user_input)
+        except Exception as e:
+            notify("error", f"자연어 처리 오류: {str(e)}")
+            return None
+
+    @TELEMETRY.traced("request_parsing")
+    async def process_user_request_async(self, user_input):
+        """process_user_request의 asyncio 버전 (캐시 조회/저장은 작업 스레드에서 실행)"""
+        cache_key, cached_content = await asyncio.to_thread(self.lookup_cached, user_input)
+        if cached_content:
+            return cached_content
+
+        try:
+            response = await self.async_client.post_chat(self.build_payload(user_input))
+            return await asyncio.to_thread(self.parse_response, response, cache_key, user_input)
+        except Exception as e:
+            notify("error", f"자연어 처리 오류: {str(e)}")
+            return None
+
+    def lookup_cached(self, user_input):
+        """정확히 같은 요청, 그다음 (사용 시) 의미가 비슷한 요청 순으로 캐시 조회해 (캐시 키, 결과) 반환"""
+        cache_key = make_cache_key(normalize_request_text(user_input), OPENAI_MODEL, NLP_PROMPT_VERSION)
+        cached_content = self.response_cache.get(cache_key)
+        if cached_content:
+            st.info("이전과 같은 요청입니다. 캐시된 분석 결과를 사용합니다.")
+            if self.use_semantic_cache:
+                self.semantic_cache.add(user_input, cached_content, partition="nlp")
+            return cache_key, cached_content
+
+        similar = self.semantic_cache.lookup(user_input, partition="nlp") if self.use_semantic_cache else None
+        if similar:
+            content_data, matched_text, similarity = similar
+            st.info(f"비슷한 요청(\"{matched_text}\", 유사도 {similarity:.2f})의 분석 결과를 재사용합니다.")
+            return cache_key, content_data
+
+        return cache_key, None
+
+    def build_payload(self, user_input):
+        return {
+            "model": OPENAI_MODEL,
             "messages": [
                 {
                     "role": "user",
@@ -319,38 +2559,131 @@ Respond with ONLY the JSON, no other text."""
             "max_tokens": 800
         }
 
-        try:
-            response = requests.post(self.openai_url, headers=headers, json=payload)
-
-            if response.status_code == 200:
-                result = response.json()
-                content = result['choices'][0]['message']['content']
-                content = content.replace('```json', '').replace('```', '').strip()
-                content_data = json.loads(content)
-                return content_data
-            else:
-                st.error(f"자연어 처리 실패: {response.status_code}")
-                return None
-        except Exception as e:
-            st.error(f"자연어 처리 오류: {str(e)}")
+    def parse_response(self, response, cache_key, user_input):
+        """응답(requests/httpx)을 해석하고 두 캐시에 저장"""
+        if response.status_code == 200:
+            result = response.json()
+            content = result['choices'][0]['message']['content']
+            content = content.replace('```json', '').replace('```', '').strip()
+            content_data = json.loads(content)
+            self.response_cache.set(cache_key, content_data)
+            if self.use_semantic_cache:
+                self.semantic_cache.add(user_input, content_data, partition="nlp")
+            return content_data
+        else:
+            notify("error", f"자연어 처리 실패: {response.status_code}")
             return None
 
 
 class SVGGenerator:
-    def __init__(self, openai_key):
-        self.openai_key = openai_key
-        self.openai_url = "https://api.openai.com/v1/chat/completions"
+    def __init__(self, openai_key, http_client=None, semantic_cache=None, use_semantic_cache=False,
+                 svg_cache=None, max_variants=SVG_CACHE_VARIANTS, async_client=None):
+        self.http_client = http_client or OpenAIClient(openai_key)
+        self.async_client = async_client
+        self.svg_cache = svg_cache or SQLiteCache(
+            CACHE_PATH, "svg",
+            max_entries=None,
+            ttl_seconds=SVG_CACHE_TTL_SECONDS,
+            max_bytes=SVG_CACHE_MAX_BYTES
+        )
+        self.max_variants = max(1, max_variants)
+        self.semantic_cache = semantic_cache or SHARED_SEMANTIC_CACHE
+        self.use_semantic_cache = use_semantic_cache
+
+    @TELEMETRY.traced("svg_generation")
+    def generate_svg(self, style_data, content_data, preview=None, regenerate=False):
+        """SVG 생성 - preview(st.empty)가 주어지면 스트리밍하며 점진적으로 렌더링
+
+        regenerate=True면 저장된 변형이 max_variants개 모일 때까지 새로 생성하고, 그 뒤로는 저장된 변형을 순환
+        """
+        lookup, cached_svg = self.lookup_svg(style_data, content_data, regenerate)
+        if cached_svg:
+            return cached_svg, lookup["prompt"]
+
+        payload = self.build_payload(lookup["prompt"])
+        if preview is not None:
+            svg_content, final_prompt = self.stream_svg(payload, lookup["prompt"], preview)
+        else:
+            svg_content, final_prompt = self.request_svg(payload, lookup["prompt"])
+
+        self.store_svg(lookup, svg_content)
+        return svg_content, final_prompt
+
+    @TELEMETRY.traced("svg_generation")
+    async def generate_svg_async(self, style_data, content_data, regenerate=False):
+        """generate_svg의 asyncio 버전 (스트리밍 미리보기 없음, 저장소 조회/저장은 작업 스레드에서 실행)"""
+        lookup, cached_svg = await asyncio.to_thread(self.lookup_svg, style_data, content_data, regenerate)
+        if cached_svg:
+            return cached_svg, lookup["prompt"]
+
+        try:
+            response = await self.async_client.post_chat(self.build_payload(lookup["prompt"]))
+            svg_content, final_prompt = self.parse_svg_response(response, lookup["prompt"])
+        except Exception as e:
+            notify("error", f"SVG 생성 오류: {str(e)}")
+            return None, None
+
+        await asyncio.to_thread(self.store_svg, lookup, svg_content)
+        return svg_content, final_prompt
 
-    def generate_svg(self, style_data, content_data):
+    def lookup_svg(self, style_data, content_data, regenerate=False):
+        """프롬프트 해시 저장소와 의미 캐시에서 SVG 조회해 (조회 정보, SVG 또는 None) 반환"""
         prompt = self.create_svg_prompt(style_data, content_data)
 
-        headers = {
-            "Content-Type": "application/json; charset=utf-8",
-            "Authorization": f"Bearer {self.openai_key}"
+        # 프롬프트가 같으면 결과도 같은 요청이므로 프롬프트 해시로 저장소 조회
+        svg_key = make_cache_key(prompt, OPENAI_MODEL)
+        svg_entry = self.svg_cache.get(svg_key) or {"variants": [], "last_served": -1}
+        variants = svg_entry["variants"]
+        lookup = {
+            "prompt": prompt,
+            "svg_key": svg_key,
+            "svg_entry": svg_entry,
+            "semantic_text": self.semantic_text(content_data),
+            "semantic_partition": "svg:" + make_cache_key(style_data),
         }
 
-        payload = {
-            "model": "gpt-4o",
+        if variants and (not regenerate or len(variants) >= self.max_variants):
+            served = len(variants) - 1
+            if regenerate:
+                served = (svg_entry["last_served"] + 1) % len(variants)
+                svg_entry["last_served"] = served
+                self.svg_cache.set(svg_key, svg_entry)
+            st.info(f"저장된 SVG를 사용합니다 (변형 {served + 1}/{len(variants)}).")
+            return lookup, variants[served]["svg"]
+
+        # 같은 스타일에서 내용이 거의 같은 요청이면 이전 SVG 재사용 (선택 사항)
+        if self.use_semantic_cache and lookup["semantic_text"] and not regenerate:
+            similar = self.semantic_cache.lookup(lookup["semantic_text"], partition=lookup["semantic_partition"])
+            if similar:
+                svg_content, matched_text, similarity = similar
+                st.info(f"비슷한 다이어그램(\"{matched_text}\", 유사도 {similarity:.2f})을 재사용합니다.")
+                return lookup, svg_content
+
+        return lookup, None
+
+    def store_svg(self, lookup, svg_content):
+        """새로 생성한 SVG를 변형 목록과 의미 캐시에 저장"""
+        if not svg_content:
+            return
+
+        svg_entry = lookup["svg_entry"]
+        variants = svg_entry["variants"]
+        variants.append({
+            "svg": svg_content,
+            "model": OPENAI_MODEL,
+            "created_at": time.time(),
+            "bytes": len(svg_content.encode("utf-8")),
+        })
+        svg_entry["variants"] = variants[-self.max_variants:]
+        svg_entry["last_served"] = len(svg_entry["variants"]) - 1
+        self.svg_cache.set(lookup["svg_key"], svg_entry)
+
+        if self.use_semantic_cache and lookup["semantic_text"]:
+            self.semantic_cache.add(lookup["semantic_text"], svg_content, partition=lookup["semantic_partition"])
+
+    def build_payload(self, prompt):
+        return {
+            "model": OPENAI_MODEL,
             "messages": [
                 {
                     "role": "user",
@@ -360,27 +2693,91 @@ class SVGGenerator:
             "max_tokens": 4000
         }
 
+    def semantic_text(self, content_data):
+        """의미 유사도 비교에 쓸 내용 요약 문장"""
+        if not content_data:
+            return ""
+        elements = content_data.get('specific_elements', [])
+        return " ".join([
+            str(content_data.get('content_type', '')),
+            str(content_data.get('main_topic', '')),
+            " ".join(map(str, elements)) if isinstance(elements, list) else str(elements),
+        ]).strip()
+
+    def request_svg(self, payload, prompt):
+        """일반(비스트리밍) 응답으로 SVG 생성"""
         try:
-            response = requests.post(self.openai_url, headers=headers, json=payload)
+            response = self.http_client.post_chat(payload)
+            return self.parse_svg_response(response, prompt)
+        except Exception as e:
+            notify("error", f"SVG 생성 오류: {str(e)}")
+            return None, None
 
-            if response.status_code == 200:
-                result = response.json()
-                svg_content = result['choices'][0]['message']['content']
+    def parse_svg_response(self, response, prompt):
+        """비스트리밍 응답(requests/httpx)에서 <svg>...</svg> 부분만 추출"""
+        if response.status_code == 200:
+            result = response.json()
+            svg_content = result['choices'][0]['message']['content']
 
-                svg_start = svg_content.find('<svg')
-                svg_end = svg_content.find('</svg>') + 6
+            svg_start = svg_content.find('<svg')
+            svg_end = svg_content.find('</svg>') + 6
 
-                if svg_start != -1 and svg_end != -1:
-                    clean_svg = svg_content[svg_start:svg_end]
-                    return clean_svg, prompt
-                else:
-                    st.error("SVG 형식을 찾을 수 없습니다")
-                    return None, None
+            if svg_start != -1 and svg_end != -1:
+                clean_svg = svg_content[svg_start:svg_end]
+                return clean_svg, prompt
             else:
-                st.error(f"SVG 생성 실패: {response.status_code}")
+                notify("error", "SVG 형식을 찾을 수 없습니다")
                 return None, None
+        else:
+            notify("error", f"SVG 생성 실패: {response.status_code}")
+            return None, None
+
+    def stream_svg(self, payload, prompt, preview):
+        """스트리밍 응답을 받으며 <svg 시작부터 미리보기를 갱신하고 </svg>에서 즉시 종료"""
+        try:
+            response = self.http_client.post_chat(
+                dict(payload, stream=True, stream_options={"include_usage": True}), stream=True
+            )
+
+            try:
+                if response.status_code != 200:
+                    notify("error", f"SVG 생성 실패: {response.status_code}")
+                    return None, None
+
+                buffer = ""
+                last_render = 0.0
+                for delta in self.http_client.iter_chat_stream(response):
+                    buffer += delta
+
+                    svg_start = buffer.find('<svg')
+                    if svg_start == -1:
+                        continue
+
+                    svg_end = buffer.find('</svg>', svg_start)
+                    if svg_end != -1:
+                        # usage 조각이 오기 전에 끊으므로 토큰 수는 추정치로 기록
+                        TELEMETRY.record_usage({
+                            "prompt_tokens": estimate_request_tokens(payload) - payload.get("max_tokens", 0),
+                            "completion_tokens": len(buffer) // 4,
+                        }, estimated=True)
+                        return buffer[svg_start:svg_end + 6], prompt
+
+                    now = time.monotonic()
+                    if now - last_render >= SVG_PREVIEW_INTERVAL_SECONDS:
+                        partial_svg = close_partial_svg(buffer[svg_start:])
+                        # 백그라운드 작업에서는 st.empty 대신 미리보기를 받을 콜백이 주어짐
+                        if callable(preview):
+                            preview(partial_svg)
+                        else:
+                            render_svg(partial_svg, preview)
+                        last_render = now
+            finally:
+                response.close()
+
+            notify("error", "SVG 형식을 찾을 수 없습니다")
+            return None, None
         except Exception as e:
-            st.error(f"SVG 생성 오류: {str(e)}")
+            notify("error", f"SVG 생성 오류: {str(e)}")
             return None, None
 
     def create_svg_prompt(self, style_data, content_data):
@@ -448,42 +2845,335 @@ Example structure for neural network:
         return prompt
 
 
-class PPTGenerationPipeline:
-    def __init__(self, openai_key):
-        self.style_analyzer = PPTStyleAnalyzer(openai_key)
-        self.nlp_processor = NaturalLanguageProcessor(openai_key)
-        self.svg_generator = SVGGenerator(openai_key)
-
-    def generate_ppt_slide(self, uploaded_file, user_request):
-        # 1. 스타일 분석
-        with st.status("PPT 스타일 분석 중...", expanded=True) as status:
-            style_data = self.style_analyzer.analyze_pdf_with_gpt4v(uploaded_file)
-
-            if not style_data:
-                status.update(label="스타일 분석 실패", state="error")
-                return None
+def close_partial_svg(partial_svg):
+    """생성 중인 SVG를 마지막 완성 태그까지 자르고 닫아 미리보기 가능하게 변환"""
+    last_tag_end = partial_svg.rfind('>')
+    if last_tag_end == -1:
+        return '<svg width="1024" height="768"></svg>'
+    return partial_svg[:last_tag_end + 1] + '</svg>'
+
+
+def render_svg(svg_content, placeholder=None):
+    """SVG를 흰 배경 카드 안에 렌더링 (placeholder가 있으면 그 자리를 교체)"""
+    target = placeholder.container() if placeholder is not None else st.container()
+    with target:
+        st.components.v1.html(
+            f"""
+            <div style="display: flex; justify-content: center; background: white; padding: 20px; border-radius: 10px; border: 1px solid #e0e0e0;">
+                {svg_content}
+            </div>
+            """,
+            height=800
+        )
 
-            status.update(label="스타일 분석 완료", state="complete")
 
-        # 2. 자연어 처리
-        with st.status("자연어 요청 처리 중...", expanded=False) as status:
-            content_data = self.nlp_processor.process_user_request(user_request)
+class PPTGenerationPipeline:
+    def __init__(self, openai_key, http_client=None, use_semantic_cache=USE_SEMANTIC_CACHE):
+        # 세 단계가 하나의 커넥션 풀을 공유하도록 클라이언트를 주입
+        self.http_client = http_client or OpenAIClient(openai_key)
+        self.style_analyzer = PPTStyleAnalyzer(openai_key, http_client=self.http_client)
+        self.nlp_processor = NaturalLanguageProcessor(
+            openai_key, http_client=self.http_client, use_semantic_cache=use_semantic_cache
+        )
+        self.svg_generator = SVGGenerator(openai_key, http_client=self.http_client)
+
+    def run_stage(self, status, stage_name, stage_fn, *args, progress_callback=None):
+        """단일 단계를 실행하고 결과에 따라 st.status 패널(또는 progress_callback) 갱신"""
+        if progress_callback is not None:
+            progress_callback(stage_name, "running")
+
+        with status if status is not None else contextlib.nullcontext():
+            result = stage_fn(*args)
+
+        state = "complete" if result else "error"
+        if status is not None:
+            status.update(label=f"{stage_name} {'완료' if result else '실패'}", state=state)
+        if progress_callback is not None:
+            progress_callback(stage_name, state)
+        return result
+
+    def generate_ppt_slide(self, uploaded_file, user_request, stream_preview=False, regenerate=False,
+                           progress_callback=None):
+        """progress_callback(stage_name, state, preview_svg=None)이 주어지면 st.status 패널 대신 콜백으로 진행 상황 보고
+
+        세션 컨텍스트가 없는 작업 스레드(JobManager)에서 실행할 때 사용
+        """
+        headless = progress_callback is not None
+
+        # 1, 2. 스타일 분석과 자연어 처리는 서로 독립적이므로 동시에 실행
+        style_status = None if headless else st.status("PPT 스타일 분석 중...", expanded=True)
+        nlp_status = None if headless else st.status("자연어 요청 처리 중...", expanded=False)
+
+        with create_thread_pool(2) as executor:
+            style_future = submit_in_context(
+                executor, self.run_stage, style_status, "스타일 분석",
+                self.style_analyzer.analyze_pdf_with_gpt4v, uploaded_file,
+                progress_callback=progress_callback
+            )
+            nlp_future = submit_in_context(
+                executor, self.run_stage, nlp_status, "자연어 처리",
+                self.nlp_processor.process_user_request, user_request,
+                progress_callback=progress_callback
+            )
 
-            if not content_data:
-                status.update(label="자연어 처리 실패", state="error")
-                return None
+            style_data = style_future.result()
+            content_data = nlp_future.result()
 
-            status.update(label="자연어 처리 완료", state="complete")
+        if not style_data or not content_data:
+            return None
 
         # 3. SVG 생성
-        with st.status("SVG 다이어그램 생성 중...", expanded=False) as status:
-            svg_content, final_prompt = self.svg_generator.generate_svg(style_data, content_data)
+        def create_svg():
+            preview = None
+            if stream_preview:
+                if headless:
+                    preview = lambda partial_svg: progress_callback("SVG 생성", "running", partial_svg)
+                else:
+                    preview = st.empty()
 
-            if not svg_content:
-                status.update(label="SVG 생성 실패", state="error")
-                return None
+            svg_content, final_prompt = self.svg_generator.generate_svg(
+                style_data, content_data, preview, regenerate=regenerate
+            )
+
+            if preview is not None and not headless:
+                preview.empty()
+            return (svg_content, final_prompt) if svg_content else None
+
+        svg_status = None if headless else st.status("SVG 다이어그램 생성 중...", expanded=stream_preview)
+        svg_result = self.run_stage(svg_status, "SVG 생성", create_svg, progress_callback=progress_callback)
+        if not svg_result:
+            return None
+
+        svg_content, final_prompt = svg_result
+        return {
+            "svg_content": svg_content,
+            "extracted_style": style_data,
+            "processed_content": content_data,
+            "final_prompt": final_prompt
+        }
+
+
+def close_shared_pipeline(pipeline):
+    pipeline.http_client.close()
+
+
+@st.cache_resource(show_spinner=False, max_entries=1, on_release=close_shared_pipeline)
+def get_shared_pipeline(openai_key):
+    """프로세스 전체가 공유하는 파이프라인 (커넥션 풀, 캐시 포함) - API 키가 바뀌면 새로 생성"""
+    return PPTGenerationPipeline(openai_key)
+
+
+JOB_STAGES = ("스타일 분석", "자연어 처리", "SVG 생성")
+JOB_ACTIVE_STATES = ("queued", "running")
+
+
+SCRIPT_RUN_CONTEXT_LOGGER = "streamlit.runtime.scriptrunner_utils.script_run_context"
+
+
+def hide_job_thread_ctx_warning(record):
+    """작업 스레드에는 세션 컨텍스트가 없어 st 호출이 무시되므로 그때마다 남는 경고를 숨김"""
+    return not threading.current_thread().name.startswith(JOB_THREAD_PREFIX)
+
+
+def hide_ctx_warnings(record):
+    return False
+
+
+def silence_script_ctx_warnings():
+    """Streamlit 밖(CLI, 벤치마크)에서 파이프라인을 쓸 때 st 호출마다 남는 세션 컨텍스트 경고를 숨김"""
+    logging.getLogger(SCRIPT_RUN_CONTEXT_LOGGER).addFilter(hide_ctx_warnings)
+
+
+class JobManager:
+    """생성 요청을 작업 스레드 풀에서 끝까지 실행하고 진행 상황과 결과를 보관
+
+    스크립트 재실행이나 브라우저 재접속과 무관하게 진행되며, store(SQLiteCache)가 있으면
+    완료된 결과를 프로세스 재시작 후에도 조회할 수 있다.
+    """
+
+    def __init__(self, pipeline, max_workers=JOB_WORKERS, store=None, ttl_seconds=JOB_TTL_SECONDS):
+        self.pipeline = pipeline
+        self.store = store
+        self.ttl_seconds = ttl_seconds
+        self.jobs = {}
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=JOB_THREAD_PREFIX)
+        logging.getLogger(SCRIPT_RUN_CONTEXT_LOGGER).addFilter(hide_job_thread_ctx_warning)
+
+    def submit(self, pdf_bytes, user_request, regenerate=False):
+        """작업을 대기열에 넣고 작업 id 반환 (업로드 파일은 바이트로 복사해 전달)"""
+        self.prune()
+
+        now = time.time()
+        job = {
+            "id": uuid.uuid4().hex,
+            "state": "queued",
+            "user_request": user_request,
+            "stages": {stage_name: "queued" for stage_name in JOB_STAGES},
+            "preview_svg": None,
+            "messages": [],
+            "result": None,
+            "error": None,
+            "created_at": now,
+            "updated_at": now,
+        }
+        with self.lock:
+            self.jobs[job["id"]] = job
+        self.persist(job)
+
+        self.executor.submit(self.run_job, job["id"], pdf_bytes, user_request, regenerate)
+        return job["id"]
+
+    def get(self, job_id):
+        """작업 상태 스냅샷 반환, 없으면 None"""
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is not None:
+                return dict(job, stages=dict(job["stages"]), messages=list(job["messages"]))
+
+        job = self.store.get(job_id) if self.store is not None else None
+        if job and job["state"] in JOB_ACTIVE_STATES:
+            # 저장소에는 진행 중으로 남아 있지만 이 프로세스에는 없음 - 재시작으로 중단된 작업
+            job = dict(job, state="failed", error="서버가 재시작되어 작업이 중단되었습니다.")
+        return job
+
+    def update(self, job_id, stage_name=None, stage_state=None, persist=True, **changes):
+        with self.lock:
+            job = self.jobs[job_id]
+            if stage_name is not None:
+                job["stages"][stage_name] = stage_state
+            job.update(changes)
+            job["updated_at"] = time.time()
+            snapshot = dict(job, stages=dict(job["stages"]), messages=list(job["messages"]))
+
+        if persist:
+            self.persist(snapshot)
+
+    def add_message(self, job_id, level, message):
+        """단계에서 보낸 오류/경고 메시지를 작업에 기록 (최근 JOB_MAX_MESSAGES개, 다음 update 때 저장)"""
+        with self.lock:
+            messages = self.jobs[job_id]["messages"]
+            messages.append({"level": level, "message": message})
+            del messages[:-JOB_MAX_MESSAGES]
+
+    def persist(self, job):
+        if self.store is not None:
+            self.store.set(job["id"], dict(job, preview_svg=None))
+
+    def prune(self):
+        """보관 기간이 지난 완료 작업을 메모리에서 제거 (저장소에는 TTL까지 남음)"""
+        cutoff = time.time() - self.ttl_seconds
+        with self.lock:
+            expired = [
+                job_id for job_id, job in self.jobs.items()
+                if job["state"] not in JOB_ACTIVE_STATES and job["updated_at"] < cutoff
+            ]
+            for job_id in expired:
+                del self.jobs[job_id]
+
+    def run_job(self, job_id, pdf_bytes, user_request, regenerate):
+        def report(stage_name, state, preview_svg=None):
+            # 미리보기는 자주 갱신되므로 메모리에만 반영
+            if preview_svg is not None:
+                self.update(job_id, stage_name, state, persist=False, preview_svg=preview_svg)
+            else:
+                self.update(job_id, stage_name, state)
+
+        self.update(job_id, state="running")
+        # 단계의 st.error/st.warning은 이 스레드에서 무시되므로 작업 메시지로 수집 (단계 스레드에도 컨텍스트로 전달됨)
+        sink_token = STAGE_MESSAGE_SINK.set(functools.partial(self.add_message, job_id))
+        try:
+            result = self.pipeline.generate_ppt_slide(
+                io.BytesIO(pdf_bytes), user_request,
+                stream_preview=True, regenerate=regenerate, progress_callback=report
+            )
+        except Exception as e:
+            self.update(job_id, state="failed", error=str(e), preview_svg=None)
+            return
+        finally:
+            STAGE_MESSAGE_SINK.reset(sink_token)
+
+        if result:
+            self.update(job_id, state="complete", result=result, preview_svg=None)
+            return
+
+        # 가장 먼저 보고된 단계 오류가 실패 원인
+        errors = [entry["message"] for entry in self.get(job_id)["messages"] if entry["level"] == "error"]
+        error = errors[0] if errors else "다이어그램 생성에 실패했습니다."
+        self.update(job_id, state="failed", error=error, preview_svg=None)
+
+    def shutdown(self):
+        # 진행 중인 작업은 끝까지 실행
+        self.executor.shutdown(wait=False)
+
+
+def close_job_manager(job_manager):
+    job_manager.shutdown()
+
+
+@st.cache_resource(show_spinner=False, max_entries=1, on_release=close_job_manager)
+def get_job_manager(openai_key):
+    """프로세스 전체가 공유하는 작업 관리자"""
+    store = None
+    if JOB_STORE_PATH:
+        store = SQLiteCache(
+            JOB_STORE_PATH, "job",
+            max_entries=JOB_STORE_MAX_ENTRIES,
+            ttl_seconds=JOB_TTL_SECONDS
+        )
+    return JobManager(get_shared_pipeline(openai_key), store=store)
+
+
+@st.cache_resource(show_spinner=False)
+def start_telemetry():
+    """프로세스당 한 번 - OTLP span 내보내기 설정과 Prometheus /metrics 서버 시작"""
+    configure_otel_exporter()
+    if not METRICS_PORT:
+        return None
+    try:
+        return start_metrics_server(METRICS_PORT)
+    except OSError as e:
+        # 같은 포트를 쓰는 다른 프로세스가 있어도 앱은 계속 동작
+        TELEMETRY.log("metrics_server_error", port=METRICS_PORT, error=str(e))
+        return None
+
+
+class AsyncPPTGenerationPipeline:
+    """PPTGenerationPipeline의 asyncio 버전 - 요청마다 스레드를 쓰지 않고 하나의 이벤트 루프에서 동시 처리
+
+    Streamlit에서는 run()으로 백그라운드 이벤트 루프에 실행을 맡기고, 스크립트 밖(배치/서버)에서는
+    generate_ppt_slide를 직접 await 한다. st.status 패널과 SVG 스트리밍 미리보기는 제공하지 않는다.
+    """
+
+    def __init__(self, openai_key, async_client=None, use_semantic_cache=USE_SEMANTIC_CACHE):
+        self.async_client = async_client or AsyncOpenAIClient(openai_key)
+        # 단계 클래스가 각자 동기 클라이언트(커넥션 풀)를 만들지 않도록 하나를 공유하고 aclose에서 닫음
+        self.http_client = OpenAIClient(openai_key, rate_limiter=self.async_client.rate_limiter)
+        self.style_analyzer = PPTStyleAnalyzer(
+            openai_key, http_client=self.http_client, async_client=self.async_client
+        )
+        self.nlp_processor = NaturalLanguageProcessor(
+            openai_key, http_client=self.http_client, async_client=self.async_client,
+            use_semantic_cache=use_semantic_cache
+        )
+        self.svg_generator = SVGGenerator(openai_key, http_client=self.http_client, async_client=self.async_client)
+
+    async def generate_ppt_slide(self, pdf_bytes, user_request, regenerate=False):
+        # 1, 2. 스타일 분석과 자연어 처리는 서로 독립적이므로 동시에 실행
+        style_data, content_data = await asyncio.gather(
+            self.style_analyzer.analyze_pdf_async(pdf_bytes),
+            self.nlp_processor.process_user_request_async(user_request)
+        )
+
+        if not style_data or not content_data:
+            return None
 
-            status.update(label="SVG 생성 완료", state="complete")
+        # 3. SVG 생성
+        svg_content, final_prompt = await self.svg_generator.generate_svg_async(
+            style_data, content_data, regenerate=regenerate
+        )
+        if not svg_content:
+            return None
 
         return {
             "svg_content": svg_content,
@@ -492,147 +3182,221 @@ class PPTGenerationPipeline:
             "final_prompt": final_prompt
         }
 
+    def run_in_background(self, pdf_bytes, user_request, regenerate=False):
+        """백그라운드 이벤트 루프에 생성을 제출하고 concurrent.futures.Future 반환"""
+        return get_background_loop().submit(
+            self.generate_ppt_slide(pdf_bytes, user_request, regenerate=regenerate)
+        )
+
+    def run(self, pdf_bytes, user_request, regenerate=False, timeout=None):
+        """동기 코드(Streamlit 스크립트)에서 호출해 결과를 기다림"""
+        return self.run_in_background(pdf_bytes, user_request, regenerate=regenerate).result(timeout)
+
+    async def aclose(self):
+        await self.async_client.aclose()
+        self.http_client.close()
+
 
 def load_background_image():
     """배경 이미지 로드"""
-    background_path = "background.png" 
+    background_path = BACKGROUND_PATH
     if os.path.exists(background_path):
         return background_path
     return None
 
 
+@st.cache_data(show_spinner=False)
+def load_background_asset(image_path, mtime):
+    """배경 이미지를 표시 크기로 줄이고 재압축 - 파일 수정 시각별로 프로세스당 한 번만 실행"""
+    image_format = BACKGROUND_FORMAT
+    with Image.open(image_path) as image:
+        image = image.convert("RGBA" if image_format in ("webp", "png") else "RGB")
+        # 흰색 반투명 레이어 아래에 깔리므로 표시 크기 이상의 해상도는 필요 없음
+        image.thumbnail(BACKGROUND_DISPLAY_SIZE, Image.LANCZOS)
+
+        buffer = io.BytesIO()
+        try:
+            image.save(buffer, format=image_format.upper(), quality=BACKGROUND_QUALITY, method=6)
+        except (KeyError, OSError):
+            # WebP 지원 없이 빌드된 Pillow
+            image_format = "png"
+            buffer = io.BytesIO()
+            image.save(buffer, format="PNG", optimize=True)
+
+    data = buffer.getvalue()
+    digest = hashlib.sha256(data).hexdigest()[:12]
+    return {
+        "data": data,
+        "mime_type": f"image/{image_format}",
+        "file_name": f"background-{digest}.{image_format}",
+    }
+
+
+def background_url(asset):
+    """정적 파일 URL(브라우저 캐시 가능), 정적 서빙이 꺼져 있으면 data URI"""
+    if st.get_option("server.enableStaticServing"):
+        static_path = os.path.join(STATIC_DIR, asset["file_name"])
+        try:
+            if not os.path.exists(static_path):
+                os.makedirs(STATIC_DIR, exist_ok=True)
+                # 내용 해시가 파일 이름에 들어 있으므로 같은 이름이면 같은 내용
+                tmp_path = f"{static_path}.{os.getpid()}.tmp"
+                with open(tmp_path, "wb") as f:
+                    f.write(asset["data"])
+                os.replace(tmp_path, static_path)
+            return f"app/static/{asset['file_name']}"
+        except OSError:
+            pass
+
+    return f"data:{asset['mime_type']};base64,{base64.b64encode(asset['data']).decode()}"
+
+
+APP_STYLE = """
+.main-container {
+    background-color: rgba(255, 255, 255, 0.95);
+    padding: 2rem;
+    border-radius: 15px;
+    margin: 2rem auto;
+    max-width: 800px;
+    box-shadow: 0 4px 20px rgba(0,0,0,0.1);
+}
+
+.upload-container {
+    background: white;
+    padding: 2rem;
+    border-radius: 12px;
+    border: 2px dashed #cccccc;
+    margin-bottom: 2rem;
+    text-align: center;
+}
+
+.input-container {
+    background: white;
+    padding: 2rem;
+    border-radius: 12px;
+    border: 1px solid #e0e0e0;
+    margin-bottom: 2rem;
+}
+
+.result-container {
+    background: white;
+    padding: 2rem;
+    border-radius: 12px;
+    border: 1px solid #e0e0e0;
+    margin-top: 2rem;
+}
+
+.title {
+    text-align: center;
+    font-size: 2.5rem;
+    font-weight: 600;
+    color: #2c3e50;
+    margin-bottom: 0.5rem;
+}
+
+.subtitle {
+    text-align: center;
+    font-size: 1.2rem;
+    color: #7f8c8d;
+    margin-bottom: 2rem;
+}
+"""
+
+
 def set_background_style():
     """배경 스타일 설정"""
     background_path = load_background_image()
 
     if background_path:
-        st.markdown(f"""
-        <style>
-        .stApp {{
-            background: linear-gradient(rgba(255,255,255,0.8), rgba(255,255,255,0.8)), url('data:image/jpeg;base64,{get_base64_image(background_path)}');
-            background-size: 729px 956px;
-            background-position: center;
-            background-repeat: no-repeat;
-            background-attachment: fixed;
-        }}
-
-        .main-container {{
-            background-color: rgba(255, 255, 255, 0.95);
-            padding: 2rem;
-            border-radius: 15px;
-            margin: 2rem auto;
-            max-width: 800px;
-            box-shadow: 0 4px 20px rgba(0,0,0,0.1);
-        }}
-
-        .upload-container {{
-            background: white;
-            padding: 2rem;
-            border-radius: 12px;
-            border: 2px dashed #cccccc;
-            margin-bottom: 2rem;
-            text-align: center;
-        }}
-
-        .input-container {{
-            background: white;
-            padding: 2rem;
-            border-radius: 12px;
-            border: 1px solid #e0e0e0;
-            margin-bottom: 2rem;
-        }}
-
-        .result-container {{
-            background: white;
-            padding: 2rem;
-            border-radius: 12px;
-            border: 1px solid #e0e0e0;
-            margin-top: 2rem;
-        }}
-
-        .title {{
-            text-align: center;
-            font-size: 2.5rem;
-            font-weight: 600;
-            color: #2c3e50;
-            margin-bottom: 0.5rem;
-        }}
-
-        .subtitle {{
-            text-align: center;
-            font-size: 1.2rem;
-            color: #7f8c8d;
-            margin-bottom: 2rem;
-        }}
-        </style>
-        """, unsafe_allow_html=True)
+        asset = load_background_asset(background_path, os.path.getmtime(background_path))
+        background_style = f"""
+.stApp {{
+    background: linear-gradient(rgba(255,255,255,0.8), rgba(255,255,255,0.8)), url('{background_url(asset)}');
+    background-size: {BACKGROUND_DISPLAY_SIZE[0]}px {BACKGROUND_DISPLAY_SIZE[1]}px;
+    background-position: center;
+    background-repeat: no-repeat;
+    background-attachment: fixed;
+}}
+"""
     else:
         # 배경 이미지가 없는 경우 - 그라데이션 배경
-        st.markdown("""
-        <style>
-        .stApp {
-            background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-        }
+        background_style = """
+.stApp {
+    background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
+}
+"""
 
-        .main-container {
-            background-color: rgba(255, 255, 255, 0.95);
-            padding: 2rem;
-            border-radius: 15px;
-            margin: 2rem auto;
-            max-width: 800px;
-            box-shadow: 0 4px 20px rgba(0,0,0,0.1);
-        }
+    st.markdown(f"<style>{background_style}{APP_STYLE}</style>", unsafe_allow_html=True)
 
-        .upload-container {
-            background: white;
-            padding: 2rem;
-            border-radius: 12px;
-            border: 2px dashed #cccccc;
-            margin-bottom: 2rem;
-            text-align: center;
-        }
 
-        .input-container {
-            background: white;
-            padding: 2rem;
-            border-radius: 12px;
-            border: 1px solid #e0e0e0;
-            margin-bottom: 2rem;
-        }
+JOB_STATE_ICONS = {"queued": "⏳", "running": "🔄", "complete": "✅", "error": "❌"}
 
-        .result-container {
-            background: white;
-            padding: 2rem;
-            border-radius: 12px;
-            border: 1px solid #e0e0e0;
-            margin-top: 2rem;
-        }
 
-        .title {
-            text-align: center;
-            font-size: 2.5rem;
-            font-weight: 600;
-            color: #2c3e50;
-            margin-bottom: 0.5rem;
-        }
+@st.fragment(run_every=JOB_POLL_INTERVAL_SECONDS)
+def show_job_progress(job_manager, job_id):
+    """진행 중인 작업 상태를 주기적으로 다시 그림 - 끝나면 전체 화면을 다시 실행해 결과 표시"""
+    job = job_manager.get(job_id)
+    if job is None or job["state"] not in JOB_ACTIVE_STATES:
+        st.rerun()
 
-        .subtitle {
-            text-align: center;
-            font-size: 1.2rem;
-            color: #7f8c8d;
-            margin-bottom: 2rem;
-        }
-        </style>
-        """, unsafe_allow_html=True)
+    finished = sum(1 for state in job["stages"].values() if state in ("complete", "error"))
+    st.progress(finished / len(job["stages"]), text="다이어그램 생성 중...")
+    for stage_name, state in job["stages"].items():
+        st.write(f"{JOB_STATE_ICONS.get(state, '')} {stage_name}")
 
+    show_job_messages(job)
 
-def get_base64_image(image_path):
-    """이미지를 base64로 변환"""
-    try:
-        with open(image_path, "rb") as img_file:
-            return base64.b64encode(img_file.read()).decode()
-    except:
-        return ""
+    if job["preview_svg"]:
+        render_svg(job["preview_svg"])
+
+
+def show_job_messages(job):
+    """작업 스레드의 단계에서 보낸 오류/경고 메시지 표시"""
+    for entry in job.get("messages", []):
+        if entry["message"] != job.get("error"):
+            getattr(st, entry["level"])(entry["message"])
+
+
+def show_result(result):
+    st.markdown("### Generated Diagram")
+
+    render_svg(result["svg_content"])
+
+    col1, col2 = st.columns(2)
+
+    with col1:
+        st.download_button(
+            label="Download SVG",
+            data=result["svg_content"],
+            file_name="generated_diagram.svg",
+            mime="image/svg+xml",
+            use_container_width=True
+        )
+
+    with col2:
+        try:
+            import cairosvg
+            png_data = cairosvg.svg2png(bytestring=result["svg_content"].encode('utf-8'))
+            st.download_button(
+                label="Download PNG",
+                data=png_data,
+                file_name="generated_diagram.png",
+                mime="image/png",
+                use_container_width=True
+            )
+        except ImportError:
+            st.info("Install cairosvg for PNG export: pip install cairosvg")
+
+    with st.expander("View Analysis Details"):
+        col1, col2 = st.columns(2)
+
+        with col1:
+            st.markdown("**Extracted Style:**")
+            st.json(result["extracted_style"])
+
+        with col2:
+            st.markdown("**Content Analysis:**")
+            st.json(result["processed_content"])
 
 
 def main():
@@ -644,13 +3408,13 @@ def main():
     )
 
     set_background_style()
+    start_telemetry()
 
     openai_key = load_api_key()
     if not openai_key:
         return
 
-    if 'pipeline' not in st.session_state:
-        st.session_state.pipeline = PPTGenerationPipeline(openai_key)
+    job_manager = get_job_manager(openai_key)
 
     st.markdown('<div class="title">Welcome to CNU Img Generator</div>', unsafe_allow_html=True)
     st.markdown('<div class="subtitle">Upload your PPT and generate custom diagrams</div>', unsafe_allow_html=True)
@@ -684,62 +3448,39 @@ def main():
             use_container_width=True,
             disabled=not (uploaded_file and user_input)
         )
+    with col3:
+        regenerate_button = st.button(
+            "Regenerate",
+            use_container_width=True,
+            disabled=not (uploaded_file and user_input),
+            help="Generate a different variant for the same request"
+        )
 
-    if generate_button and uploaded_file and user_input:
-        st.markdown('<div class="result-container">', unsafe_allow_html=True)
-
-        result = st.session_state.pipeline.generate_ppt_slide(uploaded_file, user_input)
-
-        if result:
-            st.markdown("### Generated Diagram")
-
-            st.components.v1.html(
-                f"""
-                <div style="display: flex; justify-content: center; background: white; padding: 20px; border-radius: 10px; border: 1px solid #e0e0e0;">
-                    {result["svg_content"]}
-                </div>
-                """,
-                height=800
-            )
-
-            col1, col2 = st.columns(2)
-
-            with col1:
-                st.download_button(
-                    label="Download SVG",
-                    data=result["svg_content"],
-                    file_name="generated_diagram.svg",
-                    mime="image/svg+xml",
-                    use_container_width=True
-                )
-
-            with col2:
-                try:
-                    import cairosvg
-                    png_data = cairosvg.svg2png(bytestring=result["svg_content"].encode('utf-8'))
-                    st.download_button(
-                        label="Download PNG",
-                        data=png_data,
-                        file_name="generated_diagram.png",
-                        mime="image/png",
-                        use_container_width=True
-                    )
-                except ImportError:
-                    st.info("Install cairosvg for PNG export: pip install cairosvg")
-
-            with st.expander("View Analysis Details"):
-                col1, col2 = st.columns(2)
+    if (generate_button or regenerate_button) and uploaded_file and user_input:
+        # 버튼 처리는 작업 제출만 하고 바로 반환 - 이후 재실행/재접속에도 작업은 계속 진행
+        st.session_state.job_id = job_manager.submit(
+            uploaded_file.getvalue(), user_input, regenerate=regenerate_button
+        )
+        # 새로고침하면 세션이 새로 시작되므로 URL에도 작업 id를 남김
+        st.query_params[JOB_QUERY_PARAM] = st.session_state.job_id
 
-                with col1:
-                    st.markdown("**Extracted Style:**")
-                    st.json(result["extracted_style"])
+    job_id = st.session_state.get("job_id") or st.query_params.get(JOB_QUERY_PARAM)
+    job = job_manager.get(job_id) if job_id else None
+    if job_id and job is None:
+        # 보관 기간이 지났거나 잘못된 id
+        st.query_params.pop(JOB_QUERY_PARAM, None)
 
-                with col2:
-                    st.markdown("**Content Analysis:**")
-                    st.json(result["processed_content"])
+    if job:
+        st.markdown('<div class="result-container">', unsafe_allow_html=True)
 
+        if job["state"] in JOB_ACTIVE_STATES:
+            show_job_progress(job_manager, job_id)
+        elif job["state"] == "complete":
+            show_result(job["result"])
         else:
-            st.error("Failed to generate diagram. Please try again.")
+            st.error(f"Failed to generate diagram: {job['error']}" if job.get("error")
+                     else "Failed to generate diagram. Please try again.")
+            show_job_messages(job)
 
         st.markdown('</div>', unsafe_allow_html=True)
 
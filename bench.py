@@ -0,0 +1,422 @@
+"""PPTGenerationPipeline 오프라인 벤치마크
+
+유료 API 대신 로컬 chat completions 대역 서버(지연 분포, 오류율, SSE 설정 가능)를 띄우고,
+PyMuPDF로 만든 합성 PDF로 N개의 생성을 동시에 실행해 지연 시간 백분위수, 처리량, 단계별 시간을 보고한다.
+
+사용 예:
+    python bench.py --generations 40 --concurrency 8 --pages 3,10,30 --latency-ms 800 --error-rate 0.02 --passes 2
+"""
+
+import argparse
+import io
+import json
+import logging
+import math
+import os
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import fitz  # PyMuPDF
+import numpy as np
+
+import app
+
+MOCK_STYLE = {
+    "color_palette": {
+        "primary": "#1f4e79", "secondary": "#5b9bd5", "accent": "#f79646",
+        "background": "#ffffff", "text": "#2f2f2f"
+    },
+    "typography": {"title_font": "Arial Bold", "body_font": "Arial Regular", "title_size": "large", "body_size": "medium"},
+    "layout": {"alignment": "left", "spacing": "normal", "title_position": "top-left"},
+    "visual_style": {"design_approach": "corporate", "border_style": "thin", "shadow_style": "none"},
+    "brand_description": "Benchmark deck",
+    "has_diagrams": True
+}
+MOCK_CONTENT = {
+    "content_type": "diagram",
+    "main_topic": "Benchmark topic",
+    "specific_elements": ["input", "process", "output"],
+    "data_structure": "three connected boxes",
+    "visual_requirements": "flat boxes and arrows",
+    "educational_goal": "explain the flow"
+}
+MOCK_SVG = (
+    '<svg xmlns="http://www.w3.org/2000/svg" width="1024" height="768">'
+    '<rect width="1024" height="768" fill="#ffffff"/>'
+    + "".join(
+        f'<rect x="{80 + i * 300}" y="300" width="240" height="140" rx="12" fill="#5b9bd5"/>'
+        f'<text x="{200 + i * 300}" y="380" text-anchor="middle" font-family="Arial" font-size="28">Step {i + 1}</text>'
+        for i in range(3)
+    )
+    + '<text x="512" y="120" text-anchor="middle" font-family="Arial" font-size="48" fill="#1f4e79">Benchmark</text>'
+    '</svg>'
+)
+SSE_CHUNK_CHARS = 40
+
+BENCH_REQUESTS = [
+    "Create a {n}-layer neural network diagram with input, hidden, and output layers",
+    "Draw a flowchart of the {n} stages of a compiler pipeline",
+    "Make a bar chart comparing {n} sorting algorithms by average complexity",
+    "Show a timeline of {n} milestones in the history of the internet",
+    "Diagram a client-server architecture with {n} microservices and a shared database",
+]
+
+
+class QuietHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # 스트리밍 SVG는 </svg>를 받으면 클라이언트가 연결을 먼저 끊으므로 연결 오류는 정상
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+class MockChatServer:
+    """OpenAI chat completions 대역 서버 - 요청 종류(페이지 분석/일괄 분석/자연어/SVG)에 맞는 고정 응답 반환"""
+
+    def __init__(self, latency_ms=800.0, latency_sigma=0.5, error_rate=0.0, seed=0):
+        self.latency_ms = latency_ms
+        self.latency_sigma = latency_sigma
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+        self.server = None
+
+    def sample(self):
+        """(지연 초, 응답 상태 코드) - 지연은 중앙값 latency_ms인 로그정규 분포"""
+        with self.lock:
+            self.requests += 1
+            latency = self.latency_ms / 1000.0
+            if self.latency_sigma > 0:
+                latency = self.random.lognormvariate(math.log(latency), self.latency_sigma)
+
+            status = 200
+            if self.random.random() < self.error_rate:
+                self.errors += 1
+                # 재시도 경로도 측정되도록 429(짧은 retry-after)와 500을 반반씩 반환
+                status = 429 if self.random.random() < 0.5 else 500
+        return latency, status
+
+    def reply_for(self, payload):
+        message = payload["messages"][0]["content"]
+        if isinstance(message, str):
+            text, image_count = message, 0
+        else:
+            text = message[0].get("text", "")
+            image_count = sum(1 for part in message if part.get("type") == "image_url")
+
+        if "SVG" in text:
+            return MOCK_SVG
+        if "natural language request" in text:
+            # 요청마다 다른 주제를 돌려줘야 SVG 프롬프트/캐시 키도 요청마다 달라짐
+            quoted = re.search(r'"([^"]+)"', text)
+            return json.dumps(dict(MOCK_CONTENT, main_topic=quoted.group(1) if quoted else MOCK_CONTENT["main_topic"]))
+        if "JSON array" in text:
+            return json.dumps([dict(MOCK_STYLE, page=page_num) for page_num in range(1, image_count + 1)])
+        return json.dumps(MOCK_STYLE)
+
+    def start(self, host="127.0.0.1", port=0):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def send_json(self, status, body, headers=None):
+                data = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_POST(self):
+                raw = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                payload = json.loads(raw)
+                latency, status = mock.sample()
+                time.sleep(latency)
+
+                if status == 429:
+                    self.send_json(429, {"error": {"message": "rate limited"}}, {"retry-after-ms": "100"})
+                    return
+                if status != 200:
+                    self.send_json(status, {"error": {"message": "server error"}})
+                    return
+
+                content = mock.reply_for(payload)
+                usage = {
+                    "prompt_tokens": len(raw) // 4,
+                    "completion_tokens": len(content) // 4,
+                    "total_tokens": len(raw) // 4 + len(content) // 4,
+                }
+
+                if not payload.get("stream"):
+                    self.send_json(200, {"choices": [{"message": {"role": "assistant", "content": content}}], "usage": usage})
+                    return
+
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                for start in range(0, len(content), SSE_CHUNK_CHARS):
+                    chunk = {"choices": [{"delta": {"content": content[start:start + SSE_CHUNK_CHARS]}}]}
+                    self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+                    self.wfile.flush()
+                if payload.get("stream_options", {}).get("include_usage"):
+                    self.wfile.write(f"data: {json.dumps({'choices': [], 'usage': usage})}\n\n".encode("utf-8"))
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.close_connection = True
+
+        self.server = QuietHTTPServer((host, port), Handler)
+        threading.Thread(target=self.server.serve_forever, name="bench-mock", daemon=True).start()
+        return f"http://{host}:{self.server.server_address[1]}/v1"
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+
+
+def make_synthetic_pdf(page_count, seed=0):
+    """제목, 본문, 도형이 섞인 합성 슬라이드 PDF (페이지마다 구성이 조금씩 다름)"""
+    rng = random.Random(seed)
+    palette = [(0.12, 0.31, 0.47), (0.36, 0.61, 0.84), (0.97, 0.59, 0.27), (0.3, 0.3, 0.3)]
+
+    doc = fitz.open()
+    for page_index in range(page_count):
+        page = doc.new_page(width=960, height=540)
+        page.insert_text((60, 80), f"Slide {page_index + 1}: Benchmark section", fontsize=32,
+                         fontname="helv", color=palette[0])
+        for line in range(rng.randint(2, 5)):
+            page.insert_text((60, 140 + line * 28), f"Bullet point {line + 1} with some explanatory text",
+                             fontsize=16, fontname="helv", color=palette[3])
+
+        # 절반 정도의 페이지에는 다이어그램(상자와 연결선)을 그림
+        if page_index % 2 == 0:
+            boxes = rng.randint(3, 6)
+            for box in range(boxes):
+                x = 60 + box * (840 / boxes)
+                rect = fitz.Rect(x, 330, x + 110, 420)
+                page.draw_rect(rect, color=palette[0], fill=palette[1 + box % 2], width=1.5)
+                if box:
+                    page.draw_line((x - 30, 375), (x, 375), color=palette[3], width=1.5)
+
+    pdf_bytes = doc.tobytes()
+    doc.close()
+    return pdf_bytes
+
+
+def percentile(values, q):
+    return float(np.percentile(values, q)) if values else float("nan")
+
+
+class SpanCollector(logging.Handler):
+    """TELEMETRY의 JSON 로그를 받아 span 이벤트만 모음"""
+
+    def __init__(self):
+        super().__init__()
+        self.spans = []
+
+    def emit(self, record):
+        # emit은 Handler 자체 잠금 안에서 호출되므로 별도 잠금 불필요
+        event = json.loads(record.getMessage())
+        if event.get("event") == "span":
+            self.spans.append(event)
+
+    def drain(self):
+        self.acquire()
+        try:
+            spans, self.spans = self.spans, []
+        finally:
+            self.release()
+        return spans
+
+
+def noop_progress(stage_name, state, preview_svg=None):
+    pass
+
+
+def run_pass(pipeline, pdfs, user_requests, concurrency, stream):
+    """모든 생성을 동시 실행해 (생성별 지연 시간, 성공 수, 총 소요 시간) 반환"""
+    def generate(index):
+        started = time.perf_counter()
+        result = pipeline.generate_ppt_slide(
+            io.BytesIO(pdfs[index % len(pdfs)]), user_requests[index],
+            stream_preview=stream, progress_callback=noop_progress
+        )
+        return time.perf_counter() - started, bool(result)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="bench") as executor:
+        outcomes = list(executor.map(generate, range(len(user_requests))))
+    wall_seconds = time.perf_counter() - started
+
+    latencies = [seconds for seconds, _ in outcomes]
+    succeeded = sum(1 for _, ok in outcomes if ok)
+    return latencies, succeeded, wall_seconds
+
+
+def summarize_pass(pass_number, latencies, succeeded, wall_seconds, spans, mock_requests, mock_errors):
+    stages = {}
+    for span in spans:
+        stage = stages.setdefault(span["span"], {"durations": [], "http_requests": 0, "prompt_tokens": 0,
+                                                  "completion_tokens": 0, "cache_hits": 0, "cache_misses": 0})
+        stage["durations"].append(span["duration_ms"])
+        for key in ("http_requests", "prompt_tokens", "completion_tokens", "cache_hits", "cache_misses"):
+            stage[key] += span.get(key, 0)
+
+    return {
+        "pass": pass_number,
+        "generations": len(latencies),
+        "succeeded": succeeded,
+        "wall_seconds": round(wall_seconds, 3),
+        "throughput_per_minute": round(len(latencies) / wall_seconds * 60, 2) if wall_seconds else None,
+        "latency_seconds": {
+            "p50": round(percentile(latencies, 50), 3),
+            "p90": round(percentile(latencies, 90), 3),
+            "p99": round(percentile(latencies, 99), 3),
+            "max": round(max(latencies), 3) if latencies else None,
+        },
+        "mock_requests": mock_requests,
+        "mock_errors": mock_errors,
+        "stages": {
+            name: {
+                "count": len(stage["durations"]),
+                "p50_ms": round(percentile(stage["durations"], 50), 1),
+                "p95_ms": round(percentile(stage["durations"], 95), 1),
+                "total_ms": round(sum(stage["durations"]), 1),
+                "http_requests": stage["http_requests"],
+                "prompt_tokens": stage["prompt_tokens"],
+                "completion_tokens": stage["completion_tokens"],
+                "cache_hits": stage["cache_hits"],
+                "cache_misses": stage["cache_misses"],
+            }
+            for name, stage in sorted(stages.items())
+        },
+    }
+
+
+def print_summary(summary):
+    latency = summary["latency_seconds"]
+    print(
+        f"\n[pass {summary['pass']}] {summary['succeeded']}/{summary['generations']} succeeded in "
+        f"{summary['wall_seconds']:.2f}s ({summary['throughput_per_minute']}/min), "
+        f"mock requests {summary['mock_requests']} (errors {summary['mock_errors']})"
+    )
+    print(f"  end-to-end latency  p50 {latency['p50']:.3f}s  p90 {latency['p90']:.3f}s  "
+          f"p99 {latency['p99']:.3f}s  max {latency['max']:.3f}s")
+    print(f"  {'stage':<16}{'count':>7}{'p50 ms':>10}{'p95 ms':>10}{'http':>7}{'prompt tok':>12}"
+          f"{'compl tok':>11}{'cache hit/miss':>16}")
+    for name, stage in summary["stages"].items():
+        print(
+            f"  {name:<16}{stage['count']:>7}{stage['p50_ms']:>10.1f}{stage['p95_ms']:>10.1f}"
+            f"{stage['http_requests']:>7}{stage['prompt_tokens']:>12}{stage['completion_tokens']:>11}"
+            f"{str(stage['cache_hits']) + '/' + str(stage['cache_misses']):>16}"
+        )
+
+
+def parse_page_counts(value):
+    counts = [int(part) for part in re.split(r"[,\s]+", value.strip()) if part]
+    if not counts or min(counts) < 1:
+        raise argparse.ArgumentTypeError("page counts must be positive integers, e.g. 3,10,30")
+    return counts
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark PPTGenerationPipeline against a local mock API.")
+    parser.add_argument("-n", "--generations", type=int, default=20, help="generations per pass")
+    parser.add_argument("-c", "--concurrency", type=int, default=4, help="generations run at the same time")
+    parser.add_argument("--pages", type=parse_page_counts, default=[3, 10, 30],
+                        help="comma-separated page counts of the synthetic PDFs (generations cycle through them)")
+    parser.add_argument("--latency-ms", type=float, default=800.0, help="median mock response latency")
+    parser.add_argument("--latency-sigma", type=float, default=0.5,
+                        help="log-normal sigma of the mock latency (0 for a fixed latency)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of mock responses that are 429/500")
+    parser.add_argument("--stream", action="store_true", help="stream the SVG over SSE like the UI does")
+    parser.add_argument("--passes", type=int, default=1,
+                        help="repeat the same workload; later passes measure the warm caches")
+    parser.add_argument("--analysis-mode", choices=("vision", "hybrid"), default=app.ANALYSIS_MODE)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", dest="json_path", help="also write the results to this JSON file")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    app.silence_script_ctx_warnings()
+
+    collector = SpanCollector()
+    telemetry_logger = logging.getLogger(app.TELEMETRY_LOGGER)
+    telemetry_logger.handlers = [collector]
+    telemetry_logger.setLevel(logging.INFO)
+    telemetry_logger.propagate = False
+    app.TELEMETRY.json_logs = True
+
+    mock = MockChatServer(args.latency_ms, args.latency_sigma, args.error_rate, seed=args.seed)
+    base_url = mock.start()
+
+    pdfs = [make_synthetic_pdf(page_count, seed=args.seed + index) for index, page_count in enumerate(args.pages)]
+    user_requests = [
+        BENCH_REQUESTS[index % len(BENCH_REQUESTS)].format(n=index // len(BENCH_REQUESTS) + 2)
+        for index in range(args.generations)
+    ]
+
+    summaries = []
+    with tempfile.TemporaryDirectory(prefix="pptree-bench-") as cache_dir:
+        # 이전 실행이나 실제 앱의 캐시와 섞이지 않도록 캐시를 임시 폴더와 새 인스턴스로 교체
+        app.CACHE_PATH = os.path.join(cache_dir, "cache.sqlite3")
+        app.SHARED_SEMANTIC_CACHE = app.SemanticCache()
+
+        # 실제 API 한도 대신 대역 서버 성능만 측정
+        http_client = app.OpenAIClient(
+            "bench", base_url=base_url, pool_size=max(app.HTTP_POOL_SIZE, args.concurrency * 2),
+            rate_limiter=app.RateLimiter(10 ** 6, 10 ** 12)
+        )
+        pipeline = app.PPTGenerationPipeline("bench", http_client=http_client)
+        pipeline.style_analyzer.analysis_mode = args.analysis_mode
+
+        print(
+            f"mock {base_url}: latency median {args.latency_ms:.0f}ms sigma {args.latency_sigma}, "
+            f"error rate {args.error_rate:.1%}; PDFs {args.pages} pages; "
+            f"{args.generations} generations x {args.passes} pass(es), concurrency {args.concurrency}",
+            file=sys.stderr
+        )
+
+        try:
+            for pass_number in range(1, args.passes + 1):
+                requests_before, errors_before = mock.requests, mock.errors
+                latencies, succeeded, wall_seconds = run_pass(
+                    pipeline, pdfs, user_requests, max(1, args.concurrency), args.stream
+                )
+                summary = summarize_pass(
+                    pass_number, latencies, succeeded, wall_seconds, collector.drain(),
+                    mock.requests - requests_before, mock.errors - errors_before
+                )
+                summaries.append(summary)
+                print_summary(summary)
+        finally:
+            http_client.close()
+            mock.stop()
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump({"config": vars(args), "passes": summaries}, f, indent=2)
+
+    return 0 if all(summary["succeeded"] == summary["generations"] for summary in summaries) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,239 @@
+"""PPT 스타일 다이어그램 일괄 생성 CLI
+
+사용 예:
+    python cli.py slides.pdf requests.jsonl -o out --concurrency 4 --png
+
+요청 파일은 JSONL({"id": ..., "request": ...}) 또는 CSV(id, request 열)이며, id가 없으면 줄 번호를 사용한다.
+결과는 <출력 폴더>/<id>.svg(.png)와 manifest.jsonl에 기록되고, 다시 실행하면 완료된 id는 건너뛴다.
+"""
+
+import argparse
+import csv
+import json
+import os
+import re
+import sys
+import time
+from concurrent.futures import as_completed
+
+from app import (
+    MAX_CONCURRENT_PAGES,
+    OPENAI_BASE_URL,
+    USE_SEMANTIC_CACHE,
+    NaturalLanguageProcessor,
+    OpenAIClient,
+    PPTStyleAnalyzer,
+    SVGGenerator,
+    create_thread_pool,
+    silence_script_ctx_warnings,
+)
+
+MANIFEST_NAME = "manifest.jsonl"
+
+
+def log(message):
+    print(message, file=sys.stderr, flush=True)
+
+
+def read_api_key(path):
+    key = os.environ.get("OPENAI_API_KEY")
+    if key:
+        return key.strip()
+    try:
+        with open(path, 'r') as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        return None
+
+
+def load_requests(path):
+    """JSONL/CSV 요청 파일을 [(id, 요청 문장)] 목록으로 읽기"""
+    if path.lower().endswith(".csv"):
+        with open(path, newline='', encoding='utf-8') as f:
+            rows = list(csv.DictReader(f))
+    else:
+        with open(path, encoding='utf-8') as f:
+            rows = [json.loads(line) for line in f if line.strip()]
+
+    requests_list = []
+    seen = set()
+    stems = {}
+    for index, row in enumerate(rows, 1):
+        text = (row.get("request") or row.get("prompt") or "").strip()
+        if not text:
+            log(f"{index}번째 줄: request 값이 없어 건너뜁니다")
+            continue
+
+        request_id = str(row.get("id") or f"{index:04d}").strip()
+        if request_id in seen:
+            raise ValueError(f"중복된 id: {request_id}")
+        seen.add(request_id)
+
+        # r/1과 r_1처럼 다른 id라도 같은 파일 이름이 되면 결과가 서로 덮어쓰므로 거부
+        stem = output_stem(request_id)
+        if stem in stems:
+            raise ValueError(f"id {stems[stem]}와 {request_id}의 출력 파일 이름이 같습니다: {stem}")
+        stems[stem] = request_id
+        requests_list.append((request_id, text))
+    return requests_list
+
+
+def output_stem(request_id):
+    """id를 파일 이름으로 쓸 수 있게 변환"""
+    return re.sub(r'[^\w.-]', '_', request_id)
+
+
+def load_completed(manifest_path, output_dir):
+    """manifest에서 이미 완료되어 SVG 파일이 남아 있는 id 집합"""
+    completed = set()
+    if not os.path.exists(manifest_path):
+        return completed
+
+    with open(manifest_path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                # 중단 시 마지막 줄이 잘렸을 수 있음
+                continue
+            if entry.get("status") == "ok" and os.path.exists(os.path.join(output_dir, entry["svg"])):
+                completed.add(entry["id"])
+            else:
+                completed.discard(entry.get("id"))
+    return completed
+
+
+def write_png(svg_content, png_path):
+    import cairosvg
+    cairosvg.svg2png(bytestring=svg_content.encode('utf-8'), write_to=png_path)
+
+
+def generate_one(nlp_processor, svg_generator, style_data, request_id, text, output_dir, png):
+    """요청 하나를 처리해 파일을 쓰고 manifest 항목 반환"""
+    started = time.monotonic()
+    entry = {"id": request_id, "request": text}
+
+    content_data = nlp_processor.process_user_request(text)
+    if not content_data:
+        return dict(entry, status="failed", error="request parsing failed",
+                    seconds=round(time.monotonic() - started, 2))
+
+    svg_content, _ = svg_generator.generate_svg(style_data, content_data)
+    if not svg_content:
+        return dict(entry, status="failed", error="svg generation failed",
+                    seconds=round(time.monotonic() - started, 2))
+
+    stem = output_stem(request_id)
+    svg_name = f"{stem}.svg"
+    # 중단되어도 반쯤 쓰인 파일이 남지 않도록 임시 파일에 쓴 뒤 교체
+    tmp_path = os.path.join(output_dir, svg_name + ".tmp")
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(svg_content)
+    os.replace(tmp_path, os.path.join(output_dir, svg_name))
+    entry.update(status="ok", svg=svg_name, content=content_data)
+
+    if png:
+        png_name = f"{stem}.png"
+        write_png(svg_content, os.path.join(output_dir, png_name))
+        entry["png"] = png_name
+
+    entry["seconds"] = round(time.monotonic() - started, 2)
+    return entry
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Generate diagrams in bulk in the style of a PPT PDF.")
+    parser.add_argument("pdf", help="PDF of the PPT slides to learn the style from")
+    parser.add_argument("requests", help="JSONL ({\"id\", \"request\"}) or CSV (id, request) file of requests")
+    parser.add_argument("-o", "--output-dir", default="output", help="directory for SVG/PNG files and manifest.jsonl")
+    parser.add_argument("-c", "--concurrency", type=int, default=MAX_CONCURRENT_PAGES,
+                        help="number of requests processed at the same time")
+    parser.add_argument("--png", action="store_true", help="also write PNG files (requires cairosvg)")
+    parser.add_argument("--base-url", default=OPENAI_BASE_URL, help="chat completions API base URL")
+    parser.add_argument("--semantic-cache", action=argparse.BooleanOptionalAction, default=USE_SEMANTIC_CACHE,
+                        help="reuse the parsed content of near-identical requests (same content words)")
+    parser.add_argument("--api-key-file", default="api_key.txt",
+                        help="file holding the OpenAI API key (OPENAI_API_KEY takes precedence)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    silence_script_ctx_warnings()
+
+    openai_key = read_api_key(args.api_key_file)
+    if not openai_key:
+        log(f"API 키가 없습니다. OPENAI_API_KEY를 설정하거나 {args.api_key_file}에 저장해주세요.")
+        return 2
+
+    if args.png:
+        try:
+            import cairosvg  # noqa: F401
+        except ImportError:
+            log("cairosvg가 없어 PNG는 생략합니다: pip install cairosvg")
+            args.png = False
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    manifest_path = os.path.join(args.output_dir, MANIFEST_NAME)
+
+    all_requests = load_requests(args.requests)
+    completed = load_completed(manifest_path, args.output_dir)
+    pending = [(request_id, text) for request_id, text in all_requests if request_id not in completed]
+
+    log(f"요청 {len(all_requests)}개 중 완료 {len(all_requests) - len(pending)}개, 남은 요청 {len(pending)}개")
+    if not pending:
+        return 0
+
+    http_client = OpenAIClient(openai_key, base_url=args.base_url)
+    style_analyzer = PPTStyleAnalyzer(openai_key, http_client=http_client)
+    nlp_processor = NaturalLanguageProcessor(
+        openai_key, http_client=http_client, use_semantic_cache=args.semantic_cache
+    )
+    svg_generator = SVGGenerator(openai_key, http_client=http_client)
+
+    # 스타일은 한 번만 분석 (재실행 시에는 스타일 캐시에서 바로 읽힘)
+    with open(args.pdf, 'rb') as pdf_file:
+        style_data = style_analyzer.analyze_pdf_with_gpt4v(pdf_file)
+    if not style_data:
+        log("PDF 스타일 분석에 실패했습니다.")
+        return 1
+    log("스타일 분석 완료")
+
+    failed = 0
+    executor = create_thread_pool(max(1, args.concurrency))
+    try:
+        futures = {
+            executor.submit(
+                generate_one, nlp_processor, svg_generator, style_data,
+                request_id, text, args.output_dir, args.png
+            ): request_id
+            for request_id, text in pending
+        }
+
+        # manifest는 메인 스레드에서만 추가하고 줄마다 flush해 중단 시점까지의 결과를 보존
+        with open(manifest_path, 'a', encoding='utf-8') as manifest:
+            for done_count, future in enumerate(as_completed(futures), 1):
+                request_id = futures[future]
+                try:
+                    entry = future.result()
+                except Exception as e:
+                    entry = {"id": request_id, "status": "failed", "error": str(e)}
+
+                if entry["status"] != "ok":
+                    failed += 1
+                manifest.write(json.dumps(entry, ensure_ascii=False) + "\n")
+                manifest.flush()
+                log(f"[{done_count}/{len(pending)}] {request_id}: {entry['status']}")
+    except KeyboardInterrupt:
+        log("중단되었습니다. 다시 실행하면 남은 요청부터 이어서 처리합니다.")
+        return 130
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+        http_client.close()
+
+    log(f"완료: 성공 {len(pending) - failed}개, 실패 {failed}개 -> {args.output_dir}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())